@@ -30,11 +30,21 @@ from homeassistant.helpers import (
     device_registry as dr,
 )
 from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import Store
 from homeassistant.util.ssl import SSLCipherList
 
 from .core import stream, utils
-from .core.const import CONF_MEDIA_PLAYERS, DATA_CONFIG, DATA_SPEAKERS, DOMAIN
-from .core.yandex_glagol import YandexIOListener
+from .core.const import (
+    CONF_HTTP_STATS,
+    CONF_LOCAL_STATS,
+    CONF_MEDIA_PLAYERS,
+    DATA_CONFIG,
+    DATA_ENTITIES,
+    DATA_INCLUDES,
+    DATA_SPEAKERS,
+    DOMAIN,
+)
+from .core.yandex_glagol import YandexGlagol, YandexIOListener
 from .core.yandex_quasar import YandexQuasar
 from .core.yandex_session import YandexSession
 from .core.yandex_station import YandexStationBase
@@ -104,6 +114,8 @@ CONFIG_SCHEMA = vol.Schema(
                 vol.Optional(CONF_CLOUD_UPDATES): cv.boolean,
                 vol.Optional(CONF_LOCAL_UPDATES): cv.boolean,
                 vol.Optional(CONF_DEBUG, default=False): cv.boolean,
+                vol.Optional(CONF_HTTP_STATS): cv.boolean,
+                vol.Optional(CONF_LOCAL_STATS): cv.boolean,
             },
             extra=vol.ALLOW_EXTRA,
         ),
@@ -114,10 +126,15 @@ CONFIG_SCHEMA = vol.Schema(
 
 async def async_setup(hass: HomeAssistant, hass_config: dict):
     config: dict = hass_config.get(DOMAIN) or {}
-    hass.data[DOMAIN] = {DATA_CONFIG: config, DATA_SPEAKERS: {}}
+    hass.data[DOMAIN] = {
+        DATA_CONFIG: config,
+        DATA_SPEAKERS: {},
+        DATA_ENTITIES: {},
+        DATA_INCLUDES: {},
+    }
 
     # if CONF_RECOGNITION_LANG in config:
-    #     utils.fix_recognition_lang(
+    #     await utils.fix_recognition_lang(
     #         hass, "frontend_latest", config[CONF_RECOGNITION_LANG]
     #     )
 
@@ -126,6 +143,7 @@ async def async_setup(hass: HomeAssistant, hass_config: dict):
     YandexSession.ssl = config.get(CONF_SSL)
 
     if config.get(CONF_LOCAL_UPDATES, True):
+        await _init_device_tokens(hass)
         await _init_local_discovery(hass)
 
     await _init_services(hass)
@@ -194,6 +212,20 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     if config.get(CONF_CLOUD_UPDATES, True):
         quasar.start()
 
+    if config.get(CONF_LOCAL_UPDATES, True):
+        # local tokens for all speakers in background
+        hass.async_create_task(
+            YandexGlagol.tokens.prefetch(yandex, quasar.speakers + quasar.modules)
+        )
+
+    # one online status request for all cloud speakers of the account
+    await quasar.update_online_stats()
+    entry.async_on_unload(
+        async_track_time_interval(
+            hass, quasar.update_online_stats, timedelta(minutes=5)
+        )
+    )
+
     if hass_utils.incluce_devices(hass, entry):
         quasar.platforms = platforms = PLATFORMS
         entry.async_on_unload(
@@ -202,7 +234,11 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
             )
         )
     else:
-        quasar.platforms = platforms = SPEAKER_PLATFORMS
+        platforms = SPEAKER_PLATFORMS
+        # stats sensors don't depend on included devices
+        if config.get(CONF_HTTP_STATS) or config.get(CONF_LOCAL_STATS):
+            platforms = platforms + ["sensor"]
+        quasar.platforms = platforms
 
     await hass.config_entries.async_forward_entry_setups(entry, platforms)
     entry.async_on_unload(entry.add_update_listener(async_reload_entry))
@@ -218,19 +254,43 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     quasar: YandexQuasar = hass.data[DOMAIN][entry.unique_id]
     quasar.stop()
 
+    hass.data[DOMAIN][DATA_INCLUDES].pop(entry.unique_id, None)
+
     platforms = getattr(quasar, "platforms")
     return await hass.config_entries.async_unload_platforms(entry, platforms)
 
 
+async def _init_device_tokens(hass: HomeAssistant):
+    """Load local tokens from last HA run."""
+    store = Store(hass, 1, f"{DOMAIN}.tokens")
+    YandexGlagol.tokens.data = await store.async_load() or {}
+    YandexGlagol.tokens.save_handler = lambda data: store.async_delay_save(
+        lambda: data, 10
+    )
+
+
 async def _init_local_discovery(hass: HomeAssistant):
     """Init descovery local speakers with Zeroconf (mDNS)."""
     speakers: dict = hass.data[DOMAIN][DATA_SPEAKERS]
 
+    # last known addresses, so local mode starts without waiting for mDNS
+    store = Store(hass, 1, f"{DOMAIN}.speakers")
+    addresses: dict = await store.async_load() or {}
+    for did, info in addresses.items():
+        # not confirmed by station or mDNS yet
+        speakers.setdefault(did, {}).update(info, stored=True)
+
     async def found_local_speaker(info: dict):
         speaker = speakers.setdefault(info["device_id"], {})
+        changed = any(speaker.get(k) != v for k, v in info.items())
+        # connection to the stored address may be stopped
+        stored = speaker.pop("stored", False)
         speaker.update(info)
+        if changed:
+            addresses[info["device_id"]] = info
+            store.async_delay_save(lambda: addresses, 10)
         entity: YandexStationBase = speaker.get("entity")
-        if entity and entity.hass:
+        if entity and entity.hass and (changed or stored or not entity.glagol):
             await entity.init_local_mode()
             entity.async_write_ha_state()
 
@@ -260,20 +320,15 @@ async def _init_services(hass: HomeAssistant):
             except TypeError:
                 # for HA before 2025.10
                 entity_ids = await service.async_extract_entity_ids(hass, call)
-            for speaker in speakers.values():
-                entity: YandexStationBase = speaker.get("entity")
-                if (
-                    not entity
-                    or entity.entity_id not in entity_ids
-                    or not entity.glagol
-                ):
-                    continue
-                data = service.remove_entity_service_fields(call)
-                data.setdefault("command", "sendText")
-                if external := data.get("external"):
-                    data = utils.external_command(**external)
-                return await entity.glagol.send(data)
-            return {"error": "Entity not found"}
+
+            data = service.remove_entity_service_fields(call)
+            data.setdefault("command", "sendText")
+            if external := data.get("external"):
+                data = utils.external_command(**external)
+
+            return await utils.send_command(
+                hass.data[DOMAIN][DATA_ENTITIES], list(entity_ids), data
+            )
 
         hass.services.async_register(
             DOMAIN,
@@ -25,14 +25,16 @@ INCLUDE_TYPES = (
 async def async_setup_entry(hass, entry, async_add_entities):
     async_add_entities(
         YandexClimate(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
     # this should be fixed someday
     async_add_entities(
         YandexRemoteCarSeat(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] == "devices.types.remote_car.seat"
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, ("devices.types.remote_car.seat",)
+        )
     )
 
 
@@ -152,6 +154,7 @@ class YandexClimate(ClimateEntity, YandexEntity):
             self._attr_current_humidity = properties["humidity"]
 
     async def async_added_to_hass(self):
+        await super().async_added_to_hass()
         if item := self.config.get("current_temperature"):
             on_remove = utils.track_template(self.hass, item, self.on_track_temperature)
             self.async_on_remove(on_remove)
@@ -1,6 +1,10 @@
 DOMAIN = "yandex_station"
 
 CONF_MEDIA_PLAYERS = "media_players"
+CONF_HTTP_STATS = "http_stats"
+CONF_LOCAL_STATS = "local_stats"
 
 DATA_CONFIG = "config"
 DATA_SPEAKERS = "speakers"
+DATA_ENTITIES = "entities"
+DATA_INCLUDES = "includes"
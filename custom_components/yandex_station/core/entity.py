@@ -28,13 +28,17 @@ def extract_parameters(items: list[dict]) -> dict:
     return result
 
 
-def extract_state(items: list[dict]) -> dict:
-    result = {}
+def extract_changes(items: list[dict], values: dict) -> dict:
+    """Return only changed values and remember them."""
+    changes = {}
     for item in items:
-        if instance := extract_instance(item):
-            value = state.get("value") if (state := item["state"]) else None
-            result[instance] = value
-    return result
+        if not (instance := extract_instance(item)):
+            continue
+
+        value = state.get("value") if (state := item["state"]) else None
+        if instance not in values or values[instance] != value:
+            values[instance] = changes[instance] = value
+    return changes
 
 
 class YandexEntity(Entity):
@@ -62,28 +66,52 @@ class YandexEntity(Entity):
                 if value := device_info.get(key):
                     self._attr_device_info[key] = value
 
+        # last values of instances, only changes will be passed to internal_update
+        self.capabilities: dict = {}
+        self.properties: dict = {}
+
         try:
             self.internal_init(
                 extract_parameters(device["capabilities"]),
                 extract_parameters(device["properties"]),
             )
             self.internal_update(
-                extract_state(device["capabilities"]),
-                extract_state(device["properties"]),
+                extract_changes(device["capabilities"], self.capabilities),
+                extract_changes(device["properties"], self.properties),
             )
         except Exception as e:
             _LOGGER.error("Device init failed", exc_info=e)
 
         self.quasar.subscribe_update(device["id"], self.on_update)
 
+    async def async_added_to_hass(self):
+        # same subscription as in __init__, but removed together with entity
+        self.async_on_remove(
+            self.quasar.subscribe_update(self.device["id"], self.on_update)
+        )
+
     def on_update(self, device: dict):
-        self._attr_available = device["state"] in ("online", "unknown")
+        available = device["state"] in ("online", "unknown")
 
-        self.internal_update(
-            extract_state(device["capabilities"]) if "capabilities" in device else {},
-            extract_state(device["properties"]) if "properties" in device else {},
+        capabilities = (
+            extract_changes(device["capabilities"], self.capabilities)
+            if "capabilities" in device
+            else {}
+        )
+        properties = (
+            extract_changes(device["properties"], self.properties)
+            if "properties" in device
+            else {}
         )
 
+        # skip same state
+        if not capabilities and not properties and available == self._attr_available:
+            return
+
+        self._attr_available = available
+
+        self.internal_update(capabilities, properties)
+
         if self.hass and self.entity_id:
             self._async_write_ha_state()
 
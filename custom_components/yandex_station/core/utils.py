@@ -1,10 +1,15 @@
+import asyncio
 import base64
+import hashlib
+import html
 import json
 import logging
 import os
 import re
 import uuid
+from collections import deque
 from datetime import datetime
+from itertools import islice
 from logging import Logger
 from typing import Callable, List
 
@@ -20,6 +25,7 @@ from homeassistant.helpers.event import (
     TrackTemplateResult,
     async_track_template_result,
 )
+from homeassistant.helpers.storage import STORAGE_DIR
 from homeassistant.helpers.template import Template
 from yarl import URL
 
@@ -39,6 +45,11 @@ NOTIFY_TEXT = (
     "[README](https://github.com/AlexxIT/YandexStation)"
 )
 
+# max records in debug log
+DEBUG_CAPACITY = 10000
+# records per one write in debug page
+DEBUG_CHUNK = 500
+
 HTML = (
     "<!DOCTYPE html><html><head><title>YandexStation</title>"
     '<meta http-equiv="refresh" content="%s"></head>'
@@ -50,11 +61,15 @@ class YandexDebug(logging.Handler, HomeAssistantView):
     name = "yandex_station_debug"
     requires_auth = False
 
-    text = ""
+    # ring buffer: (seq, created, levelno, module, msg)
+    records: deque = None
+    seq = 0
 
     def __init__(self, hass: HomeAssistant, logger: Logger):
         super().__init__()
 
+        self.records = deque(maxlen=DEBUG_CAPACITY)
+
         logger.addHandler(self)
         logger.setLevel(logging.DEBUG)
 
@@ -76,15 +91,97 @@ class YandexDebug(logging.Handler, HomeAssistantView):
         _LOGGER.debug(f"SysInfo: {info}")
 
     def handle(self, rec: logging.LogRecord) -> None:
-        dt = datetime.fromtimestamp(rec.created).strftime("%Y-%m-%d %H:%M:%S")
         module = "main" if rec.module == "__init__" else rec.module
         # remove private data
         msg = RE_PRIVATE.sub("...", str(rec.msg))
-        self.text += f"{dt}  {rec.levelname:7}  {module:13}  {msg}\n"
+        self.seq += 1
+        self.records.append((self.seq, rec.created, rec.levelno, module, msg))
+
+    def filter_records(
+        self, since: int = 0, level: int = 0, module: str = None, limit: int = None
+    ) -> list[tuple]:
+        """Records after `since` sequence number with server-side filters."""
+        if not self.records:
+            return []
+        # seq numbers in buffer are continuous, so skip old records by index
+        start = max(since - self.records[0][0] + 1, 0)
+        items = [
+            i
+            for i in islice(self.records, start, None)
+            if i[2] >= level and (not module or i[3] == module)
+        ]
+        return items[:limit] if limit else items
 
     async def get(self, request: web.Request):
-        reload = request.query.get("r", "")
-        return web.Response(text=HTML % (reload, self.text), content_type="text/html")
+        query = request.query
+        try:
+            filters = parse_debug_query(query)
+        except ValueError as e:
+            return web.Response(status=400, text=str(e))
+
+        records = self.filter_records(**filters)
+
+        if query.get("format") == "json":
+            return web.json_response(
+                {
+                    "records": [
+                        {
+                            "seq": seq,
+                            "ts": ts,
+                            "level": logging.getLevelName(levelno),
+                            "module": module,
+                            "msg": msg,
+                        }
+                        for seq, ts, levelno, module, msg in records
+                    ],
+                    # cursor for next request: ?since=<next>
+                    "next": records[-1][0] if records else filters["since"],
+                }
+            )
+
+        # write log by chunks without building one big string
+        response = web.StreamResponse(headers={"Content-Type": "text/html"})
+        await response.prepare(request)
+        head, tail = HTML.split("%s</pre>")
+        await response.write((head % query.get("r", "")).encode())
+        for i in range(0, len(records), DEBUG_CHUNK):
+            text = "".join(
+                format_record(*record) for record in records[i : i + DEBUG_CHUNK]
+            )
+            await response.write(html.escape(text).encode())
+        await response.write(("</pre>" + tail).encode())
+        await response.write_eof()
+        return response
+
+
+def parse_debug_query(query) -> dict:
+    """Filters for YandexDebug.filter_records from request query."""
+    since = int(query.get("since", 0))
+    if since < 0:
+        raise ValueError(f"Wrong since: {since}")
+
+    limit = int(query["limit"]) if "limit" in query else None
+    if limit is not None and limit < 1:
+        raise ValueError(f"Wrong limit: {limit}")
+
+    level = 0
+    if name := query.get("level"):
+        # getLevelName returns string for unknown level
+        level = logging.getLevelName(name.upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Wrong level: {name}")
+
+    return {
+        "since": since,
+        "level": level,
+        "module": query.get("module"),
+        "limit": limit,
+    }
+
+
+def format_record(seq: int, ts: float, levelno: int, module: str, msg: str) -> str:
+    dt = datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+    return f"{dt}  {logging.getLevelName(levelno):7}  {module:13}  {msg}\n"
 
 
 def fix_dialog_text(text: str) -> str:
@@ -112,6 +209,24 @@ def update_form(name: str, **kwargs):
     }
 
 
+async def send_command(entities: dict, entity_ids: list, data: dict) -> dict:
+    """Отправляет команду на все колонки одновременно."""
+    if not entity_ids:
+        return {"error": "Entity not found"}
+
+    async def send(entity_id: str) -> dict:
+        entity = entities.get(entity_id)
+        if not entity or not entity.glagol:
+            return {"error": "Entity not found"}
+        # glagol.send has its own timeout for each speaker
+        return await entity.glagol.send(data)
+
+    responses = await asyncio.gather(*[send(i) for i in entity_ids])
+    if len(entity_ids) == 1:
+        return responses[0]  # backward compatibility
+    return dict(zip(entity_ids, responses))
+
+
 def find_station(devices, name: str = None):
     """Найти станцию по ID, имени или просто первую попавшуюся."""
     for device in devices:
@@ -327,8 +442,33 @@ async def get_zeroconf_singleton(hass: HomeAssistant):
         return Zeroconf()
 
 
-# noinspection PyProtectedMember
-def fix_recognition_lang(hass: HomeAssistant, folder: str, lng: str):
+def frontend_version() -> str | None:
+    try:
+        from importlib.metadata import version
+
+        return version("home-assistant-frontend")
+    except Exception:
+        return None
+
+
+def patch_recognition_chunk(folder: str, lng: str, cache_path: str) -> tuple | None:
+    """Blocking part of fix_recognition_lang. Should be run in executor.
+
+    Patched chunk is cached on disk for frontend version and lang, so the
+    frontend folder is scanned only after HA update.
+    """
+    version = frontend_version()
+    key = f"{version} {folder} {lng}" if version else None
+
+    try:
+        with open(cache_path + ".json", "r") as f:
+            cache = json.load(f)
+        if key and cache["key"] == key:
+            with open(cache_path + ".js", "rb") as f:
+                return cache["name"], f.read()
+    except Exception:
+        pass
+
     path = frontend._frontend_root(None).joinpath(folder)
     for child in path.iterdir():
         # find all chunc.xxxx.js files
@@ -344,19 +484,47 @@ def fix_recognition_lang(hass: HomeAssistant, folder: str, lng: str):
 
         raw = raw.replace(b"en-US", lng.encode())
 
-        async def recognition_lang(request):
-            _LOGGER.debug("Send fixed recognition lang to client")
-            return web.Response(body=raw, content_type="application/javascript")
+        if key:
+            with open(cache_path + ".js", "wb") as f:
+                f.write(raw)
+            with open(cache_path + ".json", "w") as f:
+                json.dump({"key": key, "name": child.name}, f)
 
-        hass.http.app.router.add_get(f"/frontend_latest/{child.name}", recognition_lang)
+        return child.name, raw
 
-        resource = hass.http.app.router._resources.pop()
-        hass.http.app.router._resources.insert(40, resource)
+    return None
 
-        _LOGGER.debug(f"Fix recognition lang in {folder} to {lng}")
 
+# noinspection PyProtectedMember
+async def fix_recognition_lang(hass: HomeAssistant, folder: str, lng: str):
+    cache_path = hass.config.path(STORAGE_DIR, f"{DOMAIN}_recognition")
+    chunk = await hass.async_add_executor_job(
+        patch_recognition_chunk, folder, lng, cache_path
+    )
+    if not chunk:
         return
 
+    name, raw = chunk
+    etag = '"' + hashlib.md5(raw).hexdigest() + '"'
+
+    async def recognition_lang(request: web.Request):
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        _LOGGER.debug("Send fixed recognition lang to client")
+        return web.Response(
+            body=raw,
+            content_type="application/javascript",
+            # browser should revalidate, because URL is same as original chunk
+            headers={"ETag": etag, "Cache-Control": "no-cache"},
+        )
+
+    hass.http.app.router.add_get(f"/{folder}/{name}", recognition_lang)
+
+    resource = hass.http.app.router._resources.pop()
+    hass.http.app.router._resources.insert(40, resource)
+
+    _LOGGER.debug(f"Fix recognition lang in {folder} to {lng}")
+
 
 def fix_cloud_text(text: str) -> str:
     # на июнь 2023 единственное ограничение - 100 символов
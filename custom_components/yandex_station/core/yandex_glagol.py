@@ -1,4 +1,5 @@
 import asyncio
+import base64
 import ipaddress
 import json
 import logging
@@ -7,13 +8,171 @@ import uuid
 from asyncio import Future
 from typing import Callable, Dict, Optional
 
-from aiohttp import ClientConnectorError, ClientWebSocketResponse, ServerTimeoutError
-from zeroconf import ServiceBrowser, ServiceStateChange, Zeroconf
+from aiohttp import (
+    ClientConnectorError,
+    ClientWebSocketResponse,
+    ServerTimeoutError,
+    WSMessage,
+    WSMsgType,
+)
+from zeroconf import ServiceStateChange, Zeroconf
+from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo
 
-from .yandex_session import YandexSession
+from .yandex_session import Histogram, YandexSession
 
 _LOGGER = logging.getLogger(__name__)
 
+# station silence before ping and after ping before reconnect, seconds
+WATCHDOG_DEFAULT = (7, 3)
+# custom watchdog timeouts: {platform: (ping_timeout, close_timeout)}
+WATCHDOG_TIMEOUTS: dict[str, tuple[float, float]] = {}
+# update token before it expires, seconds
+TOKEN_EXPIRES_GAP = 60
+
+
+class GlagolStats:
+    """Telemetry of local connection."""
+
+    connects: int = 0
+    disconnects: int = 0
+    timeouts: int = 0
+    # total time in cloud mode after local connection lost
+    cloud_time: float = 0
+    cloud_ts: float = 0
+    last_frame_ts: float = 0
+    # session started with on_connect and not finished yet
+    connected: bool = False
+
+    def __init__(self):
+        # command send => response time
+        self.rtt = Histogram()
+        # time between messages from station
+        self.frames = Histogram()
+        # send time of waiting requests: {request_id: ts}
+        self.sent: dict[str, float] = {}
+
+    def on_connect(self):
+        self.connects += 1
+        self.connected = True
+
+    def on_frame(self, request_id: str = None):
+        ts = time.time()
+        if self.last_frame_ts:
+            self.frames.observe(ts - self.last_frame_ts)
+        self.last_frame_ts = ts
+        if self.cloud_ts:
+            self.cloud_time += ts - self.cloud_ts
+            self.cloud_ts = 0
+        if request_id and (sent_ts := self.sent.pop(request_id, None)):
+            self.rtt.observe(ts - sent_ts)
+
+    def on_disconnect(self):
+        # failed reconnects aren't disconnects
+        if self.connected:
+            self.disconnects += 1
+            self.connected = False
+        # cloud time counts from the first failure
+        if not self.cloud_ts:
+            self.cloud_ts = time.time()
+        self.last_frame_ts = 0
+        self.sent.clear()
+
+    def as_dict(self) -> dict:
+        return {
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "timeouts": self.timeouts,
+            "cloud_time": round(
+                self.cloud_time + (time.time() - self.cloud_ts if self.cloud_ts else 0)
+            ),
+            "rtt": self.rtt.as_dict(),
+            "frames": self.frames.as_dict(),
+        }
+
+
+def token_expires(token: str) -> float | None:
+    """Expiration time from JWT token payload, if any."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload))["exp"]
+    except Exception:
+        return None
+
+
+async def fetch_device_token(session: YandexSession, device: dict) -> str:
+    _LOGGER.debug(f"{device['name']} | Обновление токена устройства")
+
+    payload = {
+        "device_id": device["quasar_info"]["device_id"],
+        "platform": device["quasar_info"]["platform"],
+    }
+    r = await session.get("https://quasar.yandex.net/glagol/token", params=payload)
+    # @dext0r: fix bug with wrong content-type
+    resp = json.loads(await r.text())
+    assert resp["status"] == "ok", resp
+
+    return resp["token"]
+
+
+class DeviceTokens:
+    """Кэш токенов локального протокола: {device_id: {"token", "expires"}}.
+
+    Токен обновляется только если истёк или колонка его не приняла, поэтому
+    для переподключения к колонке не нужен облачный запрос.
+    """
+
+    def __init__(self):
+        self.data: dict[str, dict] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.save_handler: Callable = None
+
+    def get(self, device_id: str) -> str | None:
+        if item := self.data.get(device_id):
+            expires = item.get("expires")
+            if not expires or expires > time.time() + TOKEN_EXPIRES_GAP:
+                return item["token"]
+        return None
+
+    def set(self, device_id: str, token: str):
+        self.data[device_id] = {"token": token, "expires": token_expires(token)}
+        self.save()
+
+    def remove(self, device_id: str):
+        if self.data.pop(device_id, None):
+            self.save()
+
+    def save(self):
+        if self.save_handler:
+            self.save_handler(self.data)
+
+    async def fetch(self, session: YandexSession, device: dict) -> str:
+        device_id = device["quasar_info"]["device_id"]
+        if token := self.get(device_id):
+            return token
+
+        # one request for concurrent calls
+        task = self.tasks.get(device_id)
+        if task is None:
+            task = asyncio.create_task(self._fetch(session, device))
+            self.tasks[device_id] = task
+            task.add_done_callback(lambda _: self.tasks.pop(device_id, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, session: YandexSession, device: dict) -> str:
+        token = await fetch_device_token(session, device)
+        self.set(device["quasar_info"]["device_id"], token)
+        return token
+
+    async def prefetch(self, session: YandexSession, devices: list[dict]):
+        results = await asyncio.gather(
+            *[self.fetch(session, device) for device in devices],
+            return_exceptions=True,
+        )
+        for device, result in zip(devices, results):
+            if isinstance(result, Exception):
+                _LOGGER.debug(f"{device['name']} | Can't get token: {repr(result)}")
+
 
 class YandexGlagol:
     """Класс для работы с колонкой по локальному протоколу."""
@@ -22,16 +181,17 @@ class YandexGlagol:
     url: Optional[str] = None
     ws: Optional[ClientWebSocketResponse] = None
 
-    # next_ping_ts = 0
-    # keep_task: Task = None
     update_handler: Callable = None
 
     waiters: Dict[str, Future] = {}
+    # shared for all speakers, persistent between HA restarts
+    tokens = DeviceTokens()
 
     def __init__(self, session: YandexSession, device: dict):
         self.session = session
         self.device = device
         self.loop = asyncio.get_event_loop()
+        self.stats = GlagolStats()
 
     def debug(self, text: str):
         _LOGGER.debug(f"{self.device['name']} | {text}")
@@ -47,20 +207,7 @@ class YandexGlagol:
         return self.device["name"]
 
     async def get_device_token(self):
-        self.debug("Обновление токена устройства")
-
-        payload = {
-            "device_id": self.device["quasar_info"]["device_id"],
-            "platform": self.device["quasar_info"]["platform"],
-        }
-        r = await self.session.get(
-            "https://quasar.yandex.net/glagol/token", params=payload
-        )
-        # @dext0r: fix bug with wrong content-type
-        resp = json.loads(await r.text())
-        assert resp["status"] == "ok", resp
-
-        return resp["token"]
+        return await self.tokens.fetch(self.session, self.device)
 
     async def start_or_restart(self):
         # first time
@@ -88,29 +235,29 @@ class YandexGlagol:
         fails += 1  # will be reset with first msg from station
 
         try:
-            if not self.device_token:
-                self.device_token = await self.get_device_token()
+            self.device_token = await self.get_device_token()
 
             self.ws = await self.session.ws_connect(self.url, heartbeat=55, ssl=False)
+            self.stats.on_connect()
             await self.ping(command="softwareVersion")
 
-            # if not self.keep_task or self.keep_task.done():
-            #     self.keep_task = self.loop.create_task(self._keep_connection())
-
-            async for msg in self.ws:
-                # Большая станция в режиме idle шлёт статус раз в 5 секунд,
-                # в режиме playing шлёт чаще раза в 1 секунду
-                # self.next_ping_ts = time.time() + 6
+            while True:
+                msg = await self._receive()
+                if msg.type in (WSMsgType.CLOSE, WSMsgType.CLOSING, WSMsgType.CLOSED):
+                    break
 
                 if isinstance(msg.data, ServerTimeoutError):
                     raise msg.data
 
                 data = json.loads(msg.data)
                 fails = 0  # any message - reset fails
+                # address from last HA run confirmed by station
+                self.device.pop("stored", None)
 
                 # debug(msg.data)
 
                 request_id = data.get("requestId")
+                self.stats.on_frame(request_id)
                 if request_id in self.waiters:
                     result = {"status": data["status"]}
 
@@ -138,8 +285,12 @@ class YandexGlagol:
 
                 self.update_handler(data)
 
-            # TODO: find better place
-            self.device_token = None
+            # station closes connection without any answer if token is wrong,
+            # but on the old address it may be another device
+            if fails and not self.device.get("stored"):
+                self.debug("Колонка не приняла токен")
+                self.tokens.remove(self.device["quasar_info"]["device_id"])
+                self.device_token = None
 
         except (ClientConnectorError, ConnectionResetError, ServerTimeoutError) as e:
             self.debug(f"Ошибка подключения: {repr(e)}")
@@ -157,7 +308,13 @@ class YandexGlagol:
         except Exception as e:
             _LOGGER.error(f"{self.name} => local | {repr(e)}")
 
+        if fails and self.device.get("stored"):
+            # ждём новый адрес из mDNS
+            self.debug("Нет ответа по сохранённому адресу")
+            self.url = None
+
         # возвращаемся в облачный режим
+        self.stats.on_disconnect()
         self.update_handler(None)
 
         # останавливаем попытки
@@ -172,12 +329,31 @@ class YandexGlagol:
 
         _ = asyncio.create_task(self._connect(fails))
 
-    # async def _keep_connection(self):
-    #     _LOGGER.debug("Start keep connection task")
-    #     while not self.ws.closed:
-    #         await asyncio.sleep(1)
-    #         if time.time() > self.next_ping_ts:
-    #             await self.ping()
+    async def _receive(self) -> WSMessage:
+        """Receive with watchdog. Большая станция в режиме idle шлёт статус раз
+        в 5 секунд, в режиме playing шлёт чаще раза в 1 секунду. Долгая тишина
+        означает зависшее соединение.
+        """
+        ping_timeout, close_timeout = WATCHDOG_TIMEOUTS.get(
+            self.device["quasar_info"]["platform"], WATCHDOG_DEFAULT
+        )
+        try:
+            return await self.ws.receive(timeout=ping_timeout)
+        except asyncio.TimeoutError:
+            self.debug(f"Нет сообщений {ping_timeout}с, отправляем ping")
+            await self.ping()
+
+        try:
+            return await self.ws.receive(timeout=close_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        # don't wait close answer from half-open connection
+        try:
+            await asyncio.wait_for(self.ws.close(), 1)
+        except asyncio.TimeoutError:
+            pass
+        raise ServerTimeoutError(f"No messages {ping_timeout + close_timeout}s")
 
     async def ping(self, command="ping"):
         # _LOGGER.debug("ping")
@@ -199,6 +375,7 @@ class YandexGlagol:
         request_id = str(uuid.uuid4())
 
         try:
+            self.stats.sent[request_id] = time.time()
             await self.ws.send_json(
                 {
                     "conversationToken": self.device_token,
@@ -213,15 +390,16 @@ class YandexGlagol:
             # limit future wait time
             await asyncio.wait_for(self.waiters[request_id], 5)
 
-            # self.next_ping_ts = time.time() + 0.5
-
             return self.waiters.pop(request_id).result()
 
         except asyncio.TimeoutError as e:
             _ = self.waiters.pop(request_id, None)
+            self.stats.sent.pop(request_id, None)
+            self.stats.timeouts += 1
             return {"error": repr(e)}
 
         except Exception as e:
+            self.stats.sent.pop(request_id, None)
             _LOGGER.error(f"{self.name} => local | {repr(e)}")
             return {"error": repr(e)}
 
@@ -261,19 +439,24 @@ class YandexGlagol:
 
 class YandexIOListener:
     add_handler = None
-    browser = None
+    browser: AsyncServiceBrowser = None
 
     def __init__(self, add_handler: Callable):
         self.add_handler = add_handler
+        # last announced address: {device_id: (host, port, platform)}
+        self.devices: dict[str, tuple] = {}
+        # running service info requests: {name: task}
+        self.tasks: dict[str, asyncio.Task] = {}
 
     def start(self, zeroconf: Zeroconf):
-        self.browser = ServiceBrowser(
+        self.browser = AsyncServiceBrowser(
             zeroconf, "_yandexio._tcp.local.", handlers=[self._zeroconf_handler]
         )
 
-    def stop(self, *args):
-        self.browser.cancel()
-        self.browser.zc.close()
+    async def stop(self, *args):
+        await self.browser.async_cancel()
+        for task in self.tasks.values():
+            task.cancel()
 
     def _zeroconf_handler(
         self,
@@ -282,9 +465,17 @@ class YandexIOListener:
         name: str,
         state_change: ServiceStateChange,
     ):
+        # called in event loop, one info request per service at a time
+        if state_change == ServiceStateChange.Removed or name in self.tasks:
+            return
+        task = asyncio.create_task(self._service_info(zeroconf, service_type, name))
+        self.tasks[name] = task
+        task.add_done_callback(lambda _: self.tasks.pop(name, None))
+
+    async def _service_info(self, zeroconf: Zeroconf, service_type: str, name: str):
         try:
-            info = zeroconf.get_service_info(service_type, name)
-            if not info:
+            info = AsyncServiceInfo(service_type, name)
+            if not await info.async_request(zeroconf, 3000):
                 return
 
             properties = {
@@ -292,14 +483,20 @@ class YandexIOListener:
                 for k, v in info.properties.items()
             }
 
-            self.add_handler(
-                {
-                    "device_id": properties["deviceId"],
-                    "platform": properties["platform"],
-                    "host": str(ipaddress.ip_address(info.addresses[0])),
-                    "port": info.port,
-                }
-            )
+            data = {
+                "device_id": properties["deviceId"],
+                "platform": properties["platform"],
+                "host": str(ipaddress.ip_address(info.addresses[0])),
+                "port": info.port,
+            }
+
+            # skip re-announcements of unchanged device
+            key = (data["host"], data["port"], data["platform"])
+            if self.devices.get(data["device_id"]) == key:
+                return
+            self.devices[data["device_id"]] = key
+
+            self.add_handler(data)
 
         except Exception as e:
             _LOGGER.debug("Can't get zeroconf info", exc_info=e)
@@ -1,7 +1,12 @@
 import asyncio
+import copy
 import json
 import logging
+import time
+import weakref
+from collections import deque
 from datetime import datetime
+from typing import Callable
 
 from aiohttp import WSMsgType
 
@@ -59,6 +64,15 @@ def encode(uid: str) -> str:
     return "".join([MASK_RU[MASK_EN.index(s)] for s in uid])
 
 
+def scenario_name(device_id: str, index: int) -> str:
+    return f"ХА {device_id}" if index == 0 else f"ХА {device_id} {index}"
+
+
+def scenario_trigger(device_id: str, index: int) -> str:
+    # first scenario keeps old trigger for backward compatibility
+    return encode(device_id) if index == 0 else encode(f"{device_id}-{index}")
+
+
 def parse_scenario(data: dict) -> dict:
     result = {
         k: v
@@ -95,7 +109,9 @@ def parse_device(data: dict) -> dict:
     }
 
 
-def scenario_speaker_tts(name: str, trigger: str, device_id: str, text: str) -> dict:
+def scenario_speakers(
+    name: str, trigger: str, device_ids: list[str], capability: dict
+) -> dict:
     return {
         "name": name,
         "icon": "home",
@@ -115,17 +131,10 @@ def scenario_speaker_tts(name: str, trigger: str, device_id: str, text: str) ->
                             "value": {
                                 "id": device_id,
                                 "item_type": "device",
-                                "capabilities": [
-                                    {
-                                        "type": "devices.capabilities.quasar",
-                                        "state": {
-                                            "instance": "tts",
-                                            "value": {"text": text},
-                                        },
-                                    }
-                                ],
+                                "capabilities": [capability],
                             },
                         }
+                        for device_id in device_ids
                     ]
                 },
             }
@@ -133,77 +142,185 @@ def scenario_speaker_tts(name: str, trigger: str, device_id: str, text: str) ->
     }
 
 
+def scenario_speakers_tts(
+    name: str, trigger: str, device_ids: list[str], text: str
+) -> dict:
+    capability = {
+        "type": "devices.capabilities.quasar",
+        "state": {"instance": "tts", "value": {"text": text}},
+    }
+    return scenario_speakers(name, trigger, device_ids, capability)
+
+
+def scenario_speakers_action(
+    name: str, trigger: str, device_ids: list[str], action: str
+) -> dict:
+    capability = {
+        "type": "devices.capabilities.quasar.server_action",
+        "state": {"instance": "text_action", "value": action},
+    }
+    return scenario_speakers(name, trigger, device_ids, capability)
+
+
+def scenario_speaker_tts(name: str, trigger: str, device_id: str, text: str) -> dict:
+    return scenario_speakers_tts(name, trigger, [device_id], text)
+
+
 def scenario_speaker_action(
     name: str, trigger: str, device_id: str, action: str
 ) -> dict:
-    return {
-        "name": name,
-        "icon": "home",
-        "triggers": [
-            {
-                "trigger": {"type": "scenario.trigger.voice", "value": trigger},
-            }
-        ],
-        "steps": [
-            {
-                "type": "scenarios.steps.actions.v2",
-                "parameters": {
-                    "items": [
-                        {
-                            "id": device_id,
-                            "type": "step.action.item.device",
-                            "value": {
-                                "id": device_id,
-                                "item_type": "device",
-                                "capabilities": [
-                                    {
-                                        "type": "devices.capabilities.quasar.server_action",
-                                        "state": {
-                                            "instance": "text_action",
-                                            "value": action,
-                                        },
-                                    }
-                                ],
-                            },
-                        }
-                    ]
-                },
-            }
-        ],
-    }
+    return scenario_speakers_action(name, trigger, [device_id], action)
 
 
 class Dispatcher:
-    dispatcher: dict[str, list] = None
+    dispatcher: dict[str, dict] = None
 
     def __init__(self):
         self.dispatcher = {}
 
     def subscribe_update(self, signal: str, target):
-        targets = self.dispatcher.setdefault(signal, [])
-        if target not in targets:
-            targets.append(target)
-        return lambda: targets.remove(target)
+        """Методы объектов хранятся по слабой ссылке, поэтому удалённые сущности
+        отписываются автоматически.
+        """
+        if hasattr(target, "__func__"):
+            key = (id(target.__self__), target.__func__)
+            ref = weakref.WeakMethod(target)
+        else:
+            key = target
+            ref = lambda: target
+        targets = self.dispatcher.setdefault(signal, {})
+        targets[key] = ref
+        return lambda: targets.pop(key, None)
 
     def dispatch_update(self, signal: str, message: dict):
-        if signal not in self.dispatcher:
+        targets = self.dispatcher.get(signal)
+        if not targets:
             return
-        for target in self.dispatcher[signal]:
+        # targets may unsubscribe while dispatching
+        for key, ref in list(targets.items()):
+            if (target := ref()) is None:
+                targets.pop(key, None)
+                continue
             target(message)
 
 
+class ScenarioPool:
+    """Пул сценариев одной колонки. Позволяет выполнять несколько облачных
+    команд параллельно и не перезаписывать сценарий с той же командой.
+    """
+
+    def __init__(self):
+        self.indexes: dict[str, int] = {}  # scenario_id => index
+        self.commands: dict[str, tuple] = {}  # scenario_id => last command
+        self.free: list[str] = []
+        self.size = 0  # including scenarios that are being created
+        self.condition = asyncio.Condition()
+
+    async def acquire(self, command: tuple) -> str:
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.free)
+            # prefer scenario that already holds the same command
+            sid = next(
+                (i for i in self.free if self.commands.get(i) == command),
+                self.free[0],
+            )
+            self.free.remove(sid)
+            return sid
+
+    async def release(self, sid: str):
+        async with self.condition:
+            self.free.append(sid)
+            self.condition.notify()
+
+
+class DeviceConfig:
+    """Кэш quasar_config колонки и очередь изменений для одной записи."""
+
+    config: dict = None
+    version: str = None
+    ts: float = 0
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        # changes waiting for write: [(modify, future), ...]
+        self.pending: list[tuple[Callable, asyncio.Future]] = []
+
+    def is_actual(self) -> bool:
+        return self.config is not None and time.time() - self.ts < DEVICE_CONFIG_TTL
+
+
 class YandexQuasar(Dispatcher):
     # all devices
     devices: list[dict] = None
     scenarios: list[dict] = None
     online_updated: asyncio.Event = None
+    online_ts: float = 0
     updates_task: asyncio.Task = None
 
+    # cloud scenarios for speakers: {device_id: ScenarioPool}
+    scenario_pools: dict[str, ScenarioPool] = None
+    # TTS waiting for other speakers: {text: (devices, task)}
+    tts_batches: dict[str, tuple[list, asyncio.Task]] = None
+
+    # alarms for all speakers: {quasar_device_id: [alarm, ...]}
+    alarms: dict[str, list] = None
+    alarms_lock: asyncio.Lock = None
+    alarms_ts: float = 0
+    # changed on each alarm change, load result before change isn't cached
+    alarms_generation: int = 0
+    # speakers excluded from common request: {quasar_device_id: fail time}
+    alarms_failed: dict[str, float] = None
+
+    # last full state of devices: {device_id: json}
+    snapshots: dict[str, str] = None
+    # scenarios catalog indexes: {name: id} and {trigger: id}
+    scenario_names: dict[str, str] = None
+    scenario_triggers: dict[str, str] = None
+    scenarios_indexed: list[dict] = None
+    # parsed edit payloads for update_scenario: {id: payload}
+    scenario_payloads: dict[str, dict] = None
+    scenarios_stale: bool = False
+    # last own change of scenarios: {id: ts}
+    scenarios_written: dict[str, float] = None
+
+    # cached quasar_config of speakers: {device_id: DeviceConfig}
+    device_configs: dict[str, DeviceConfig] = None
+
+    # account config is written whole, so changes go one by one
+    account_config_lock: asyncio.Lock = None
+
+    # last scenario launch in history and last dispatched launches
+    history_id: str = None
+    history_seen: deque = None
+    history_lock: asyncio.Lock = None
+    history_pending: bool = False
+
+    # updates websocket status
+    updates_connected: bool = False
+    updates_reconnects: int = 0
+    updates_ts: float = 0
+
+    # extra topics for device updates: {device_id: ("*", "house/...", ...)}
+    topics: dict[str, tuple] = None
+    topics_devices: list[dict] = None
+
     def __init__(self, session: YandexSession):
         super().__init__()
         self.session = session
         self.online_updated = asyncio.Event()
         self.online_updated.set()
+        self.alarms_lock = asyncio.Lock()
+        self.alarms_failed = {}
+        self.account_config_lock = asyncio.Lock()
+        self.scenario_pools = {}
+        self.tts_batches = {}
+        self.topics = {}
+        self.snapshots = {}
+        self.scenario_payloads = {}
+        self.scenarios_written = {}
+        self.device_configs = {}
+        self.history_seen = deque(maxlen=20)
+        self.history_lock = asyncio.Lock()
 
     async def init(self):
         """Основная функция. Возвращает список колонок."""
@@ -225,6 +342,26 @@ class YandexQuasar(Dispatcher):
         await self.load_scenarios()
         await self.load_speakers()
 
+    def device_topics(self, device_id: str) -> tuple:
+        # devices may be replaced after init (ex. fake devices)
+        if self.topics_devices is not self.devices:
+            self.topics = {}
+            for device in self.devices or []:
+                topics = [DEVICES_TOPIC]
+                if house := device.get("house_name"):
+                    topics.append(f"house/{house}")
+                    if room := device.get("room_name"):
+                        topics.append(f"room/{house}/{room}")
+                self.topics[device["id"]] = tuple(topics)
+            self.topics_devices = self.devices
+        return self.topics.get(device_id, ())
+
+    def dispatch_update(self, signal: str, message: dict):
+        super().dispatch_update(signal, message)
+        # device updates are also sent to wildcard, house and room topics
+        for topic in self.device_topics(signal):
+            super().dispatch_update(topic, message)
+
     @property
     def speakers(self):
         return [i for i in self.devices if has_quasar(i) and i.get("capabilities")]
@@ -234,23 +371,67 @@ class YandexQuasar(Dispatcher):
         # modules don't have cloud scenarios
         return [i for i in self.devices if has_quasar(i) and not i.get("capabilities")]
 
+    def scenario_index(self) -> tuple[dict, dict]:
+        """Индексы списка сценариев: ({name: id}, {trigger: id})."""
+        # scenarios list may be replaced (ex. reload)
+        if self.scenarios_indexed is not self.scenarios:
+            self.scenario_names = {}
+            self.scenario_triggers = {}
+            for scenario in self.scenarios or []:
+                self.scenario_names.setdefault(scenario.get("name"), scenario["id"])
+                try:
+                    hash = scenario["triggers"][0]["value"]
+                    self.scenario_triggers[hash] = scenario["id"]
+                except Exception:
+                    pass
+            self.scenarios_indexed = self.scenarios
+        return self.scenario_names, self.scenario_triggers
+
+    def invalidate_scenarios(self):
+        self.scenarios_stale = True
+        self.scenario_payloads.clear()
+
+    def scenario_written(self, sid: str):
+        """Own change, websocket event about it shouldn't reset the cache."""
+        self.scenarios_written[sid] = time.time()
+
+    def on_scenario_list(self, message: str):
+        # event may be one for several changes or may not come at all
+        ts = time.time() - SCENARIOS_ECHO_TIME
+        self.scenarios_written = {
+            k: v for k, v in self.scenarios_written.items() if v > ts
+        }
+
+        known = {i["id"] for i in self.scenarios or []} | self.scenarios_written.keys()
+        sids = [sid for sid in known if f'"{sid}"' in message]
+        if sids and all(sid in self.scenarios_written for sid in sids):
+            return
+
+        # scenarios changed outside HA or unknown change
+        self.invalidate_scenarios()
+
     async def load_speakers(self):
-        hashes = {}
-        for scenario in self.scenarios:
-            try:
-                hash = scenario["triggers"][0]["value"]
-                hashes[hash] = scenario["id"]
-            except Exception:
-                pass
+        _, hashes = self.scenario_index()
 
         for speaker in self.speakers:
             device_id: str = speaker["id"]
-            hash = encode(device_id)
-            speaker["scenario_id"] = (
-                hashes[hash]
-                if hash in hashes
-                else await self.add_scenario(device_id, hash)
-            )
+            pool = ScenarioPool()
+
+            for i in range(SCENARIO_POOL_SIZE):
+                hash = scenario_trigger(device_id, i)
+                if hash in hashes:
+                    pool.indexes[hashes[hash]] = i
+                elif i == 0:
+                    pool.indexes[await self.add_scenario(device_id, i)] = i
+                else:
+                    # other scenarios will be created on demand
+                    break
+
+            pool.free = list(pool.indexes)
+            pool.size = len(pool.indexes)
+
+            speaker["scenario_id"] = pool.free[0]
+            self.scenario_pools[device_id] = pool
 
     async def load_speaker_config(self, device: dict):
         """Загружаем device_id и platform для колонок. Они не приходят с полным
@@ -271,15 +452,25 @@ class YandexQuasar(Dispatcher):
         assert resp["status"] == "ok", resp
 
         self.scenarios = resp["scenarios"]
+        self.scenarios_stale = False
 
     async def update_scenario(self, name: str):
         # check if we known scenario name
-        sid = next((i["id"] for i in self.scenarios if i["name"] == name), None)
-
-        if sid is None:
+        names, _ = self.scenario_index()
+        if self.scenarios_stale or name not in names:
             # reload scenarios list
             await self.load_scenarios()
-            sid = next(i["id"] for i in self.scenarios if i["name"] == name)
+            names, _ = self.scenario_index()
+        sid = names[name]
+
+        # without updates connection we can't know about changes outside HA
+        if self.updates_connected and (payload := self.scenario_payloads.get(sid)):
+            try:
+                await self.put_scenario(sid, payload)
+                return
+            except Exception as e:
+                # scenario may be changed outside HA
+                _LOGGER.debug(f"Update cached scenario error: {repr(e)}")
 
         # load scenario info
         r = await self.session.get(
@@ -289,52 +480,120 @@ class YandexQuasar(Dispatcher):
         assert resp["status"] == "ok"
 
         # convert to scenario patch
-        payload = parse_scenario(resp["scenario"])
+        payload = self.scenario_payloads[sid] = parse_scenario(resp["scenario"])
+        await self.put_scenario(sid, payload)
+
+    async def put_scenario(self, sid: str, payload: dict):
+        self.scenario_written(sid)
         r = await self.session.put(
             f"https://iot.quasar.yandex.ru/m/v3/user/scenarios/{sid}", json=payload
         )
         resp = await r.json()
         assert resp["status"] == "ok", resp
 
-    async def add_scenario(self, device_id: str, hash: str) -> str:
+    async def add_scenario(self, device_id: str, index: int) -> str:
         """Добавляет сценарий-пустышку."""
-        payload = scenario_speaker_tts("ХА " + device_id, hash, device_id, "пустышка")
+        name = scenario_name(device_id, index)
+        trigger = scenario_trigger(device_id, index)
+        payload = scenario_speaker_tts(name, trigger, device_id, "пустышка")
         r = await self.session.post(
             f"https://iot.quasar.yandex.ru/m/v4/user/scenarios", json=payload
         )
         resp = await r.json()
         assert resp["status"] == "ok", resp
-        return resp["scenario_id"]
+
+        sid = resp["scenario_id"]
+        self.scenario_written(sid)
+        names, triggers = self.scenario_index()
+        names[name] = sid
+        triggers[trigger] = sid
+        return sid
+
+    async def grow_scenario_pool(self, device_id: str, pool: ScenarioPool):
+        """Добавляет в пул ещё один сценарий, если все текущие заняты."""
+        index = pool.size
+        pool.size += 1
+        try:
+            sid = await self.add_scenario(device_id, index)
+        except Exception:
+            pool.size -= 1
+            raise
+        pool.indexes[sid] = index
+        await pool.release(sid)
 
     async def send(self, device: dict, text: str, is_tts: bool = False):
         """Запускает сценарий на выполнение команды или TTS."""
         # skip send for yandex modules
-        if "scenario_id" not in device:
+        if device["id"] not in self.scenario_pools:
             return
         _LOGGER.debug(f"{device['name']} => cloud | {text}")
 
-        device_id = device["id"]
-        name = "ХА " + device_id
-        trigger = encode(device_id)
-        payload = (
-            scenario_speaker_tts(name, trigger, device_id, text)
-            if is_tts
-            else scenario_speaker_action(name, trigger, device_id, text)
-        )
+        if not is_tts:
+            await self.send_scenario([device], text, False)
+            return
 
-        sid = device["scenario_id"]
+        # same TTS for many speakers (ex. tts.yandex_station_say with several
+        # entity_id) will be sent with one scenario
+        if batch := self.tts_batches.get(text):
+            # skip the same speaker from several entities or calls
+            if all(i["id"] != device["id"] for i in batch[0]):
+                batch[0].append(device)
+        else:
+            devices = [device]
+            task = asyncio.create_task(self.send_tts_batch(devices, text))
+            self.tts_batches[text] = batch = (devices, task)
 
-        r = await self.session.put(
-            f"https://iot.quasar.yandex.ru/m/v4/user/scenarios/{sid}", json=payload
-        )
-        resp = await r.json()
-        assert resp["status"] == "ok", resp
+        await asyncio.shield(batch[1])
 
-        r = await self.session.post(
-            f"https://iot.quasar.yandex.ru/m/user/scenarios/{sid}/actions"
-        )
-        resp = await r.json()
-        assert resp["status"] == "ok", resp
+    async def send_tts_batch(self, devices: list[dict], text: str):
+        # wait for other speakers from the same service call
+        await asyncio.sleep(TTS_BATCH_DELAY)
+        self.tts_batches.pop(text)
+        await self.send_scenario(devices, text, True)
+
+    async def send_scenario(self, devices: list[dict], text: str, is_tts: bool):
+        # scenario from the first speaker pool can run on any speakers
+        device_id = devices[0]["id"]
+        pool = self.scenario_pools[device_id]
+
+        if not pool.free and pool.size < SCENARIO_POOL_SIZE:
+            await self.grow_scenario_pool(device_id, pool)
+
+        device_ids = [i["id"] for i in devices]
+        command = (text, is_tts, *device_ids)
+        sid = await pool.acquire(command)
+
+        try:
+            # skip scenario update if it already holds the same command
+            if pool.commands.get(sid) != command:
+                pool.commands.pop(sid, None)
+
+                index = pool.indexes[sid]
+                name = scenario_name(device_id, index)
+                trigger = scenario_trigger(device_id, index)
+                payload = (
+                    scenario_speakers_tts(name, trigger, device_ids, text)
+                    if is_tts
+                    else scenario_speakers_action(name, trigger, device_ids, text)
+                )
+
+                self.scenario_written(sid)
+                r = await self.session.put(
+                    f"https://iot.quasar.yandex.ru/m/v4/user/scenarios/{sid}",
+                    json=payload,
+                )
+                resp = await r.json()
+                assert resp["status"] == "ok", resp
+
+                pool.commands[sid] = command
+
+            r = await self.session.post(
+                f"https://iot.quasar.yandex.ru/m/user/scenarios/{sid}/actions"
+            )
+            resp = await r.json()
+            assert resp["status"] == "ok", resp
+        finally:
+            await pool.release(sid)
 
     async def load_local_speakers(self):
         """Загружает список локальных колонок. Не используется."""
@@ -350,25 +609,108 @@ class YandexQuasar(Dispatcher):
             _LOGGER.exception("Load local speakers")
             return None
 
-    async def get_device_config(self, device: dict) -> (dict, str):
+    def device_config(self, device: dict) -> DeviceConfig:
+        if not (cache := self.device_configs.get(device["id"])):
+            cache = self.device_configs[device["id"]] = DeviceConfig()
+        return cache
+
+    async def get_device_config(self, device: dict, cached: bool = False):
+        """Returns config and version. Cached config shouldn't be changed."""
+        cache = self.device_config(device)
+        if cached and cache.is_actual():
+            return cache.config, cache.version
+
         did = device["id"]
         r = await self.session.get(
             f"https://iot.quasar.yandex.ru/m/v2/user/devices/{did}/configuration"
         )
         resp = await r.json()
         assert resp["status"] == "ok", resp
-        return resp["quasar_config"], resp["quasar_config_version"]
+
+        cache.config = resp["quasar_config"]
+        cache.version = resp["quasar_config_version"]
+        cache.ts = time.time()
+        return cache.config, cache.version
 
     async def set_device_config(self, device: dict, config: dict, version: str):
         _LOGGER.debug(f"Меняем конфиг станции: {config}")
 
+        cache = self.device_config(device)
         did = device["id"]
-        r = await self.session.post(
-            f"https://iot.quasar.yandex.ru/m/v3/user/devices/{did}/configuration/quasar",
-            json={"config": config, "version": version},
-        )
-        resp = await r.json()
-        assert resp["status"] == "ok", resp
+        try:
+            r = await self.session.post(
+                f"https://iot.quasar.yandex.ru/m/v3/user/devices/{did}/configuration/quasar",
+                json={"config": config, "version": version},
+            )
+            resp = await r.json()
+            assert resp["status"] == "ok", resp
+        except Exception:
+            cache.config = None
+            raise
+
+        cache.config = config
+        # without new version next write will load config again
+        cache.version = resp.get("version")
+        cache.ts = time.time()
+
+    async def modify_device_config(self, device: dict, modify: Callable):
+        """Меняет конфиг колонки функцией modify(config). Одновременные
+        изменения объединяются в одну запись.
+        """
+        cache = self.device_config(device)
+        future = asyncio.get_running_loop().create_future()
+        cache.pending.append((modify, future))
+        async with cache.lock:
+            # change may be written together with changes of previous call
+            if not future.done():
+                await self.write_device_config(device, cache)
+        return await future
+
+    async def write_device_config(self, device: dict, cache: DeviceConfig):
+        batch, cache.pending = cache.pending, []
+
+        try:
+            for retry in range(2):
+                if retry or not cache.version or not cache.is_actual():
+                    await self.get_device_config(device)
+
+                config = cache.config
+                applied = []
+                for modify, future in batch:
+                    if future.done():
+                        continue
+                    try:
+                        # failed change shouldn't break config for others
+                        new_config = copy.deepcopy(config)
+                        modify(new_config)
+                        config = new_config
+                        applied.append(future)
+                    except Exception as e:
+                        future.set_exception(e)
+
+                if not applied:
+                    return
+
+                try:
+                    await self.set_device_config(device, config, cache.version)
+                except Exception:
+                    # version conflict or other error, try once more with new config
+                    if not retry:
+                        continue
+                    raise
+
+                for future in applied:
+                    future.set_result(None)
+                return
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # write was cancelled, other callers shouldn't wait forever
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
 
     async def get_device(self, device: dict):
         r = await self.session.get(
@@ -454,63 +796,96 @@ class YandexQuasar(Dispatcher):
         device = await self.get_device(device)
         self.dispatch_update(device["id"], device)
 
-    async def update_online_stats(self):
+    async def update_online_stats(self, *args):
+        """Обновляет онлайн статус всех колонок аккаунта одним запросом.
+        Изменения рассылаются только затронутым колонкам.
+        """
         if not self.online_updated.is_set():
             await self.online_updated.wait()
             return
 
-        self.online_updated.clear()
+        if time.time() < self.online_ts + ONLINE_TTL:
+            return
 
-        # _LOGGER.debug(f"Update speakers online status")
+        self.online_updated.clear()
 
         try:
             r = await self.session.get("https://quasar.yandex.ru/devices_online_stats")
             resp = await r.json()
             assert resp["status"] == "ok", resp
+            self.online_ts = time.time()
         except:
             return
         finally:
             self.online_updated.set()
 
+        devices = {
+            device["quasar_info"]["device_id"]: device
+            for device in self.devices
+            if "quasar_info" in device
+        }
+
         for speaker in resp["items"]:
-            for device in self.devices:
-                if (
-                    "quasar_info" not in device
-                    or device["quasar_info"]["device_id"] != speaker["id"]
-                ):
+            device = devices.get(speaker["id"])
+            if not device or device.get("online") == speaker["online"]:
+                continue
+            device["online"] = speaker["online"]
+            self.dispatch_update(device["id"] + "/online", device)
+
+    def dispatch_devices(self, resp: dict):
+        """Dispatch devices from full list, only if they changed since last list."""
+        for house in resp["households"]:
+            if "sharing_info" in house:
+                continue
+            for device in house["all"]:
+                snapshot = json.dumps(device, sort_keys=True)
+                if self.snapshots.get(device["id"]) == snapshot:
                     continue
-                device["online"] = speaker["online"]
-                break
+                self.snapshots[device["id"]] = snapshot
+                self.dispatch_update(device["id"], device)
 
     async def connect(self):
         r = await self.session.get("https://iot.quasar.yandex.ru/m/v3/user/devices")
         resp = await r.json()
         assert resp["status"] == "ok", resp
 
-        for house in resp["households"]:
-            if "sharing_info" in house:
-                continue
-            for device in house["all"]:
-                self.dispatch_update(device["id"], device)
+        # fill the gap while updates were disconnected
+        self.dispatch_devices(resp)
+        # scenarios may be changed while updates were disconnected
+        self.scenarios_written.clear()
+        self.invalidate_scenarios()
 
         ws = await self.session.ws_connect(resp["updates_url"], heartbeat=60)
-        async for msg in ws:
-            if msg.type != WSMsgType.TEXT:
-                break
-            resp = msg.json()
-            # "ping", "update_scenario_list"
-            operation = resp.get("operation")
-            if operation == "update_states":
-                try:
-                    resp = json.loads(resp["message"])
-                    for device in resp["updated_devices"]:
-                        self.dispatch_update(device["id"], device)
-                except Exception as e:
-                    _LOGGER.debug(f"Parse quasar update error: {msg.data}", exc_info=e)
-
-            elif operation == "update_scenario_list":
-                if '"source":"create_scenario_launch"' in resp["message"]:
-                    _ = asyncio.create_task(self.get_voice_trigger(3))
+        self.updates_connected = True
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                self.updates_ts = time.time()
+                resp = msg.json()
+                # "ping", "update_scenario_list"
+                operation = resp.get("operation")
+                if operation == "update_states":
+                    try:
+                        resp = json.loads(resp["message"])
+                        for device in resp["updated_devices"]:
+                            # next full list should be dispatched for this device
+                            self.snapshots.pop(device["id"], None)
+                            self.dispatch_update(device["id"], device)
+                    except Exception as e:
+                        _LOGGER.debug(
+                            f"Parse quasar update error: {msg.data}", exc_info=e
+                        )
+
+                elif operation == "update_scenario_list":
+                    if '"source":"create_scenario_launch"' in resp["message"]:
+                        _ = asyncio.create_task(
+                            self.on_scenario_launch(resp["message"])
+                        )
+                    else:
+                        self.on_scenario_list(resp["message"])
+        finally:
+            self.updates_connected = False
 
     async def devices_passive_update(self, *args):
         try:
@@ -520,68 +895,143 @@ class YandexQuasar(Dispatcher):
             resp = await r.json()
             assert resp["status"] == "ok", resp
 
-            for house in resp["households"]:
-                if "sharing_info" in house:
-                    continue
-                for device in house["all"]:
-                    self.dispatch_update(device["id"], device)
+            self.dispatch_devices(resp)
         except Exception as e:
             _LOGGER.debug(f"Devices forceupdate problem: {repr(e)}")
 
+    @property
+    def updates_status(self) -> dict:
+        return {
+            "connected": self.updates_connected,
+            "reconnects": self.updates_reconnects,
+            # seconds from last message, server sends ping regularly
+            "lag": round(time.time() - self.updates_ts) if self.updates_ts else None,
+        }
+
     async def get_voice_trigger(self, retries: int = 0):
-        try:
-            # 1. Get all scenarios history
-            r = await self.session.get(
-                "https://iot.quasar.yandex.ru/m/user/scenarios/history"
-            )
-            raw = await r.json()
+        # one running history check for all triggers, others wait for recheck
+        if self.history_lock.locked():
+            self.history_pending = True
+            return
 
-            # 2. Search latest scenario with voice trigger
-            for scenario in raw["scenarios"]:
-                if scenario["trigger_type"] == "scenario.trigger.voice":
+        async with self.history_lock:
+            while True:
+                self.history_pending = False
+                try:
+                    await self.check_voice_history(retries)
+                except Exception as e:
+                    _LOGGER.debug("Can't get voice scenario", exc_info=e)
+                if not self.history_pending:
                     break
-            else:
-                return
 
-            # 3. Check if scenario too old
-            d1 = datetime.strptime(r.headers["Date"], "%a, %d %b %Y %H:%M:%S %Z")
-            d2 = datetime.strptime(scenario["launch_time"], "%Y-%m-%dT%H:%M:%SZ")
-            dt = (d1 - d2).total_seconds()
-            if dt > 5:
-                # try to get history once more
-                if retries:
-                    # 3 - 0.5s, 2 - 1.5s, 1 - 2.5s, 0 - skip
-                    await asyncio.sleep(3.5 - retries)
-                    await self.get_voice_trigger(retries - 1)
-                return
+    async def check_voice_history(self, retries: int):
+        for delay in (0,) + VOICE_RETRY_DELAYS[:retries]:
+            await asyncio.sleep(delay)
+            # history can be updated later than websocket message
+            if launches := await self.load_voice_history():
+                break
+        else:
+            return
+
+        # from older to newer
+        for scenario in reversed(launches):
+            await self.dispatch_launch(scenario["id"])
+
+    async def load_voice_history(self) -> list[dict]:
+        """Voice scenario launches after last processed launch, newest first."""
+        r = await self.session.get(
+            "https://iot.quasar.yandex.ru/m/user/scenarios/history"
+        )
+        raw = await r.json()
+
+        now = datetime.strptime(r.headers["Date"], "%a, %d %b %Y %H:%M:%S %Z")
+        # without cursor only latest launch can be new
+        max_age = VOICE_MAX_AGE if self.history_id else 5
+
+        launches = []
+        for scenario in raw["scenarios"]:
+            if scenario["id"] == self.history_id:
+                break
+            if scenario["trigger_type"] != "scenario.trigger.voice":
+                continue
+            ts = datetime.strptime(scenario["launch_time"], "%Y-%m-%dT%H:%M:%SZ")
+            if (now - ts).total_seconds() > max_age:
+                break
+            launches.append(scenario)
+            if not self.history_id:
+                break
 
-            # 4. Get speakers from launch devices
+        if raw["scenarios"]:
+            self.history_id = raw["scenarios"][0]["id"]
+
+        return launches
+
+    async def dispatch_launch(self, launch_id: str, launch: dict = None):
+        if launch_id in self.history_seen:
+            return
+
+        # Get speakers from launch devices
+        if launch is None:
             r = await self.session.get(
-                f"https://iot.quasar.yandex.ru/m/v4/user/scenarios/launches/{scenario['id']}"
+                f"https://iot.quasar.yandex.ru/m/v4/user/scenarios/launches/{launch_id}"
             )
             raw = await r.json()
+            launch = raw["launch"]
 
-            for step in raw["launch"]["steps"]:
-                for item in step["parameters"]["items"]:
-                    if item["type"] != "step.action.item.device":
-                        continue
-                    device = item["value"]
-                    # 5. Check if speaker device
-                    if "quasar_info" not in device:
-                        continue
-                    device["scenario_name"] = raw["launch"]["name"]
-                    self.dispatch_update(device["id"], device)
+        devices = []
+        for step in launch["steps"]:
+            for item in step["parameters"]["items"]:
+                if item["type"] != "step.action.item.device":
+                    continue
+                device = item["value"]
+                # Check if speaker device
+                if "quasar_info" not in device:
+                    continue
+                device["scenario_name"] = launch["name"]
+                devices.append(device)
+
+        # launch may be dispatched from websocket while loading
+        if launch_id in self.history_seen:
+            return
 
+        for device in devices:
+            self.dispatch_update(device["id"], device)
+
+        # only dispatched launches, failed ones can be loaded from history
+        self.history_seen.append(launch_id)
+
+    async def on_scenario_launch(self, message: str):
+        try:
+            # use launch from websocket message if it has one
+            launch = json.loads(message).get("launch")
+            if (
+                launch
+                and launch.get("trigger_type") == "scenario.trigger.voice"
+                and "steps" in launch
+            ):
+                await self.dispatch_launch(launch["id"], launch)
+                return
         except Exception as e:
-            _LOGGER.debug("Can't get voice scenario", exc_info=e)
+            _LOGGER.debug(f"Parse scenario launch error: {message}", exc_info=e)
+
+        await self.get_voice_trigger(len(VOICE_RETRY_DELAYS))
 
     async def run_forever(self):
+        fails = 0
         while not self.session.closed:
+            ts = time.time()
             try:
                 await self.connect()
+                # reconnect immediately after clean close from server side
+                fails = 0 if time.time() - ts > RECONNECT_MIN_TIME else fails + 1
             except Exception as e:
                 _LOGGER.debug("Quasar update error", exc_info=e)
-            await asyncio.sleep(30)
+                fails += 1
+
+            self.updates_reconnects += 1
+            if fails:
+                # 5s, 10s, 20s, ... 5 min
+                await asyncio.sleep(min(RECONNECT_DELAY * 2 ** (fails - 1), 300))
 
     def start(self):
         self.updates_task = asyncio.create_task(self.run_forever())
@@ -592,40 +1042,106 @@ class YandexQuasar(Dispatcher):
         self.dispatcher.clear()
 
     async def set_account_config(self, key: str, value):
-        kv = ACCOUNT_CONFIG.get(key)
-        assert kv and value in kv["values"], f"{key}={value}"
+        await self.set_account_configs({key: value})
+
+    async def set_account_configs(self, values: dict):
+        """Меняет несколько настроек аккаунта, один запрос на каждое API."""
+        settings = {}
+        config = {}
+        for key, value in values.items():
+            kv = ACCOUNT_CONFIG.get(key)
+            assert kv and value in kv["values"], f"{key}={value}"
+            if kv.get("api") == "user/settings":
+                settings[kv["key"]] = kv["values"][value]
+            else:
+                config[kv["key"]] = kv["values"][value]
 
-        if kv.get("api") == "user/settings":
+        if settings:
             # https://iot.quasar.yandex.ru/m/user/settings
             r = await self.session.post(
-                f"https://iot.quasar.yandex.ru/m/user/settings",
-                json={kv["key"]: kv["values"][value]},
+                f"https://iot.quasar.yandex.ru/m/user/settings", json=settings
             )
-
-        else:
-            r = await self.session.get("https://quasar.yandex.ru/get_account_config")
             resp = await r.json()
             assert resp["status"] == "ok", resp
 
-            payload: dict = resp["config"]
-            payload[kv["key"]] = kv["values"][value]
-
-            r = await self.session.post(
-                "https://quasar.yandex.ru/set_account_config", json=payload
-            )
+        if config:
+            await self.update_account_config(config)
 
+    async def get_account_config(self) -> dict:
+        r = await self.session.get("https://quasar.yandex.ru/get_account_config")
         resp = await r.json()
         assert resp["status"] == "ok", resp
+        return resp["config"]
+
+    async def update_account_config(self, patch: dict):
+        # write full config, so it should be fresh and changes one by one
+        async with self.account_config_lock:
+            config = await self.get_account_config()
+            r = await self.session.post(
+                "https://quasar.yandex.ru/set_account_config", json={**config, **patch}
+            )
+            resp = await r.json()
+            assert resp["status"] == "ok", resp
 
-    async def get_alarms(self, device: dict):
+    async def load_alarms(self) -> dict[str, list]:
+        """Загружает будильники всех колонок одним запросом."""
+        generation = self.alarms_generation
+        ts = time.time()
+        # bad speaker breaks common request, so don't ask it for some time
+        device_ids = [
+            did
+            for i in self.speakers
+            if (did := i["quasar_info"]["device_id"]) not in self.alarms_failed
+            or ts > self.alarms_failed[did] + ALARMS_FAILED_TTL
+        ]
+        try:
+            alarms = {did: [] for did in device_ids}
+            for alarm in await self.request_alarms(device_ids):
+                alarms.setdefault(alarm["device_id"], []).append(alarm)
+        except Exception as e:
+            _LOGGER.debug(f"Get alarms for all speakers error: {repr(e)}")
+            # one bad speaker shouldn't break calendars of others
+            results = await asyncio.gather(
+                *[self.request_alarms([did]) for did in device_ids],
+                return_exceptions=True,
+            )
+            alarms = {}
+            for did, result in zip(device_ids, results):
+                if isinstance(result, Exception):
+                    self.alarms_failed[did] = ts
+                else:
+                    alarms[did] = result
+
+        if generation == self.alarms_generation:
+            self.alarms = alarms
+            self.alarms_ts = time.time()
+        return alarms
+
+    async def request_alarms(self, device_ids: list[str]) -> list[dict]:
         r = await self.session.post(
             "https://rpc.alice.yandex.ru/gproxy/get_alarms",
-            json={"device_ids": [device["quasar_info"]["device_id"]]},
+            json={"device_ids": device_ids},
             headers=ALARM_HEADERS,
         )
         resp = await r.json()
         return resp["alarms"]
 
+    async def get_alarms(self, device: dict) -> list[dict]:
+        did = device["quasar_info"]["device_id"]
+        # one request for all calendar entities within the same update cycle
+        async with self.alarms_lock:
+            alarms = self.alarms
+            if alarms is None or time.time() > self.alarms_ts + ALARMS_TTL:
+                alarms = await self.load_alarms()
+        if did in alarms:
+            return alarms[did]
+        # speaker failed recently, error for this speaker only
+        raise Exception(f"Get alarms for {did} failed")
+
+    def invalidate_alarms(self):
+        self.alarms = None
+        self.alarms_generation += 1
+
     async def create_alarm(self, device: dict, alarm: dict) -> bool:
         alarm["device_id"] = device["quasar_info"]["device_id"]
         resp = await self.session.post(
@@ -633,6 +1149,7 @@ class YandexQuasar(Dispatcher):
             json={"alarm": alarm, "device_type": device["type"]},
             headers=ALARM_HEADERS,
         )
+        self.invalidate_alarms()
         return resp.ok
 
     async def change_alarm(self, device: dict, alarm: dict) -> bool:
@@ -642,6 +1159,7 @@ class YandexQuasar(Dispatcher):
             json={"alarm": alarm, "device_type": device["type"]},
             headers=ALARM_HEADERS,
         )
+        self.invalidate_alarms()
         return resp.ok
 
     async def cancel_alarms(self, device: dict, alarm_id: str) -> bool:
@@ -657,9 +1175,43 @@ class YandexQuasar(Dispatcher):
             },
             headers=ALARM_HEADERS,
         )
+        self.invalidate_alarms()
         return resp.ok
 
 
+# maximum number of cloud scenarios for each speaker
+SCENARIO_POOL_SIZE = 3
+
+# time to collect the same TTS for several speakers
+TTS_BATCH_DELAY = 0.05
+
+# online status is shared by all speakers of the account
+ONLINE_TTL = 60
+
+# calendar entities update at different moments of the same cycle
+ALARMS_TTL = 10
+# speaker failed to load alarms isn't asked again for this time
+ALARMS_FAILED_TTL = 300
+
+# topic with updates from all devices
+DEVICES_TOPIC = "*"
+
+# updates connection shorter than this is an error, seconds
+RECONNECT_MIN_TIME = 10
+# first reconnect delay after error, seconds
+RECONNECT_DELAY = 5
+
+# history requests delays if websocket message came before history update
+VOICE_RETRY_DELAYS = (0.5, 1, 1.5)
+# max voice launch age in history, seconds
+VOICE_MAX_AGE = 60
+
+# websocket event about own scenario change comes within this time, seconds
+SCENARIOS_ECHO_TIME = 5
+
+# speaker config cache for reads, seconds
+DEVICE_CONFIG_TTL = 60
+
 ALARM_HEADERS = {
     "accept": "application/json",
     "origin": "https://yandex.ru",
@@ -1,16 +1,32 @@
 import asyncio
 import base64
+import bisect
 import json
 import logging
 import pickle
+import random
 import re
 import time
 from typing import Awaitable
 
-from aiohttp import ClientResponse, ClientSession
+from aiohttp import ClientError, ClientResponse, ClientSession
+from yarl import URL
 
 _LOGGER = logging.getLogger(__name__)
 
+# CSRF token will be updated before this age
+CSRF_TTL = 3600
+# request retries after error
+RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+# consecutive failures to open circuit breaker
+BREAKER_FAILURES = 5
+# seconds before next try with open breaker
+BREAKER_TIMEOUT = 30
+# upper bounds of latency histogram buckets, seconds
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
 
 class LoginResponse:
     def __init__(self, resp: dict):
@@ -37,6 +53,97 @@ class LoginResponse:
         return self.raw["x_token"]
 
 
+class CircuitBreaker:
+    """Fail fast for endpoint family (host) while Yandex cloud is degraded."""
+
+    failures: int = 0
+    # breaker is open until this time
+    open_ts: float = 0
+
+    @property
+    def state(self) -> str:
+        if self.failures < BREAKER_FAILURES:
+            return "closed"
+        return "open" if time.time() < self.open_ts else "half_open"
+
+    def check(self, url: str):
+        if self.state == "open":
+            raise Exception(f"{url} circuit breaker is open")
+
+    def success(self):
+        self.failures = 0
+
+    def failure(self, retry_after: float = None):
+        self.failures += 1
+        if self.failures >= BREAKER_FAILURES:
+            # half open breaker will be opened again after first failure
+            self.open_ts = time.time() + (retry_after or BREAKER_TIMEOUT)
+
+    def as_dict(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        buckets = [f"<={i}" for i in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}"]
+        return {
+            "count": self.count,
+            "avg": round(self.sum / self.count, 3) if self.count else None,
+            "buckets": dict(zip(buckets, self.counts)),
+        }
+
+
+class EndpointStats:
+    """Request counters and latency histograms for endpoint family (host)."""
+
+    requests: int = 0
+    errors: int = 0
+    retries: int = 0
+    in_flight: int = 0
+
+    def __init__(self):
+        # throttle and CSRF token wait before request
+        self.wait = Histogram()
+        # network time of each try
+        self.latency = Histogram()
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "retries": self.retries,
+            "in_flight": self.in_flight,
+            "wait": self.wait.as_dict(),
+            "latency": self.latency.as_dict(),
+        }
+
+
+def endpoint_family(url: str) -> str:
+    return URL(url).host
+
+
+def retry_after(r: ClientResponse) -> float | None:
+    try:
+        return min(float(r.headers["Retry-After"]), BACKOFF_MAX)
+    except Exception:
+        return None
+
+
+def backoff_delay(attempt: int) -> float:
+    # full jitter exponential backoff
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
 class BasicSession:
     _session: ClientSession
 
@@ -75,6 +182,8 @@ class YandexSession(BasicSession):
     auth_headers: dict = None
     auth_json: dict = None
     csrf_token = None
+    csrf_ts: float = 0
+    cookies_ts: float = 0
 
     last_ts: float = 0
 
@@ -110,6 +219,23 @@ class YandexSession(BasicSession):
                 cookie_jar._cookies = _cookies
 
         self._update_listeners = []
+        # running auth refresh tasks: {name: task}
+        self._auth_tasks: dict[str, asyncio.Task] = {}
+        # last data sent to listeners
+        self._saved = (x_token, music_token, cookie)
+        # circuit breakers: {endpoint_family: CircuitBreaker}
+        self.breakers: dict[str, CircuitBreaker] = {}
+        # request stats: {endpoint_family: EndpointStats}
+        self.stats: dict[str, EndpointStats] = {}
+
+    async def _single_flight(self, name: str, coro_func):
+        """Concurrent callers wait for one refresh instead of starting their own."""
+        task = self._auth_tasks.get(name)
+        if task is None:
+            task = asyncio.create_task(coro_func())
+            self._auth_tasks[name] = task
+            task.add_done_callback(lambda _: self._auth_tasks.pop(name, None))
+        return await asyncio.shield(task)
 
     def add_update_listener(self, coro):
         """Listeners to handle automatic cookies update."""
@@ -247,6 +373,11 @@ class YandexSession(BasicSession):
 
     async def refresh_cookies(self) -> bool:
         """Checks if cookies ok and updates them if necessary."""
+        return await self._single_flight("cookies", self._refresh_cookies)
+
+    async def _refresh_cookies(self) -> bool:
+        self.cookies_ts = time.time()
+
         # check cookies
         r = await self._get("https://yandex.ru/quasar?storage=1")
         resp = await r.json()
@@ -257,9 +388,32 @@ class YandexSession(BasicSession):
         # refresh cookies
         ok = await self.login_token(self.x_token)
         if ok:
+            self.cookies_ts = time.time()
             await self._handle_update()
         return ok
 
+    async def update_csrf_token(self) -> str:
+        return await self._single_flight("csrf", self._update_csrf_token)
+
+    async def _update_csrf_token(self) -> str:
+        _LOGGER.debug(f"Обновление CSRF-токена, proxy: {self.proxy}")
+        r = await self._get("https://yandex.ru/quasar")
+        raw = await r.text()
+        m = re.search('"csrfToken2":"(.+?)"', raw)
+        assert m, raw
+        self.csrf_token = m[1]
+        self.csrf_ts = time.time()
+        return self.csrf_token
+
+    async def update_music_token(self) -> str:
+        return await self._single_flight("music", self._update_music_token)
+
+    async def _update_music_token(self) -> str:
+        assert self.x_token, "x-token required"
+        self.music_token = await self.get_music_token(self.x_token)
+        await self._handle_update()
+        return self.music_token
+
     async def get_music_token(self, x_token: str):
         """Get music token using x-token. Usual you should'n call this method."""
         _LOGGER.debug("Get music token")
@@ -295,67 +449,118 @@ class YandexSession(BasicSession):
             kwargs.setdefault("ssl", self.ssl)
         return await self._session.ws_connect(*args, **kwargs)
 
-    async def request(self, method: str, url: str, retry: int = 2, **kwargs):
+    def endpoint(self, url: str) -> tuple[CircuitBreaker, EndpointStats]:
+        family = endpoint_family(url)
+        if not (breaker := self.breakers.get(family)):
+            breaker = self.breakers[family] = CircuitBreaker()
+            self.stats[family] = EndpointStats()
+        return breaker, self.stats[family]
+
+    async def _request_breaker(
+        self,
+        breaker: CircuitBreaker,
+        stats: EndpointStats,
+        method: str,
+        url: str,
+        **kwargs,
+    ) -> ClientResponse:
+        breaker.check(url)
+        stats.requests += 1
+        stats.in_flight += 1
+        ts = time.time()
+        try:
+            r = await self._request(method, url, **kwargs)
+        except (ClientError, asyncio.TimeoutError):
+            stats.errors += 1
+            breaker.failure()
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.latency.observe(time.time() - ts)
+        if r.status != 200:
+            stats.errors += 1
+        if r.status >= 500 or r.status == 429:
+            breaker.failure(retry_after(r))
+        else:
+            breaker.success()
+        return r
+
+    async def _retry_delay(self, r: ClientResponse, retry: int):
+        # no delay for auth errors, token already refreshed
+        if r.status >= 500 or r.status == 429:
+            delay = retry_after(r) or backoff_delay(RETRIES - retry)
+            _LOGGER.debug(f"Retry delay {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    async def request(self, method: str, url: str, retry: int = RETRIES, **kwargs):
         """Public request function"""
+        breaker, stats = self.endpoint(url)
+        breaker.check(url)
+        wait_ts = time.time()
+
         # DDoS protection for Yandex servers
         while (delay := self.last_ts + 0.2 - time.time()) > 0:
             await asyncio.sleep(delay)
         self.last_ts = time.time()
 
         # all except GET should contain CSRF token
+        csrf_token = None
         if method != "get" and not url.startswith("https://rpc.alice.yandex.ru"):
-            if self.csrf_token is None:
-                _LOGGER.debug(f"Обновление CSRF-токена, proxy: {self.proxy}")
-                r = await self._get(
-                    "https://yandex.ru/quasar", proxy=self.proxy, ssl=self.ssl
-                )
-                raw = await r.text()
-                m = re.search('"csrfToken2":"(.+?)"', raw)
-                assert m, raw
-                self.csrf_token = m[1]
-
-            kwargs["headers"] = {"x-csrf-token": self.csrf_token}
-
-        r = await self._request(method, url, **kwargs)
+            csrf_token = self.csrf_token
+            if csrf_token is None or time.time() - self.csrf_ts > CSRF_TTL:
+                csrf_token = await self.update_csrf_token()
+
+            kwargs["headers"] = {"x-csrf-token": csrf_token}
+
+        ts = time.time()
+        stats.wait.observe(ts - wait_ts)
+        r = await self._request_breaker(breaker, stats, method, url, **kwargs)
         if r.status == 200:
             return r
         elif r.status == 400:
             retry = 0
         elif r.status == 401:
-            # 401 - no cookies
-            await self.refresh_cookies()
+            # 401 - no cookies, skip if cookies were refreshed during request
+            if self.cookies_ts < ts:
+                await self.refresh_cookies()
         elif r.status == 403:
-            # 403 - no x-csrf-token
-            self.csrf_token = None
+            # 403 - no x-csrf-token, skip if token was already changed
+            if self.csrf_token == csrf_token:
+                self.csrf_token = None
         elif not url.endswith("/get_alarms"):
             _LOGGER.warning(f"{url} return {r.status} status")
 
         if retry:
             _LOGGER.debug(f"Retry {method} {url}")
+            stats.retries += 1
+            await self._retry_delay(r, retry)
             return await self.request(method, url, retry - 1, **kwargs)
 
         raise Exception(f"{url} return {r.status} status")
 
-    async def request_glagol(self, url: str, retry: int = 2, **kwargs):
+    async def request_glagol(self, url: str, retry: int = RETRIES, **kwargs):
+        breaker, stats = self.endpoint(url)
+        breaker.check(url)
+
         # update music token if needed
-        if not self.music_token:
-            assert self.x_token, "x-token required"
-            self.music_token = await self.get_music_token(self.x_token)
-            await self._handle_update()
+        music_token = self.music_token or await self.update_music_token()
 
         # OAuth should be capitalize, or music will be 128 bitrate quality
         headers = kwargs.setdefault("headers", {})
-        headers["Authorization"] = f"OAuth {self.music_token}"
-        r = await self._get(url, **kwargs)
+        headers["Authorization"] = f"OAuth {music_token}"
+        r = await self._request_breaker(breaker, stats, "get", url, **kwargs)
         if r.status == 200:
             return r
         elif r.status == 403:
-            # clear music token if problem
-            self.music_token = None
+            # clear music token if problem and nobody changed it yet
+            if self.music_token == music_token:
+                self.music_token = None
 
         if retry:
             _LOGGER.debug(f"Retry {url}")
-            return await self.request_glagol(url, retry - 1)
+            stats.retries += 1
+            await self._retry_delay(r, retry)
+            return await self.request_glagol(url, retry - 1, **kwargs)
 
         raise Exception(f"{url} return {r.status} status")
 
@@ -367,7 +572,10 @@ class YandexSession(BasicSession):
         return base64.b64encode(raw).decode()
 
     async def _handle_update(self):
+        # each save rewrites config entry, so skip it if nothing changed
+        saved = (self.x_token, self.music_token, self.cookie)
+        if saved == self._saved:
+            return
+        self._saved = saved
         for coro in self._update_listeners:
-            await coro(
-                x_token=self.x_token, music_token=self.music_token, cookie=self.cookie
-            )
+            await coro(x_token=saved[0], music_token=saved[1], cookie=saved[2])
@@ -33,7 +33,7 @@ from homeassistant.helpers.template import Template
 from homeassistant.util import slugify
 
 from . import stream, utils
-from .const import DATA_CONFIG, DOMAIN
+from .const import DATA_CONFIG, DATA_ENTITIES, DOMAIN
 from .quasar_info import QUASAR_INFO, is_tv
 from .yandex_glagol import YandexGlagol
 from .yandex_music import get_file_info
@@ -184,10 +184,12 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         self.requests = {}
 
         self._attr_assumed_state = True
+        # cloud mode, online status loaded before entities setup
+        self._attr_available = device.get("online", False)
         self._attr_is_volume_muted = False
         self._attr_media_image_remotely_accessible = True
         self._attr_name = device["name"]
-        self._attr_should_poll = True
+        self._attr_should_poll = False
         self._attr_state = MediaPlayerState.IDLE
         self._attr_sound_mode_list = [SOUND_MODE1, SOUND_MODE2]
         self._attr_sound_mode = SOUND_MODE1
@@ -218,6 +220,7 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         self.internal_update_is_on(device)
 
         quasar.subscribe_update(device["id"], self.on_update)
+        quasar.subscribe_update(device["id"] + "/online", self.on_online)
 
     @property
     def extra_state_attributes(self):
@@ -266,6 +269,16 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
                 self.debug(f"yandex_speaker: {event_data}")
                 self.hass.bus.async_fire("yandex_speaker", event_data)
 
+    def on_online(self, device: dict):
+        # online status matters only while cloud connected
+        if self.local_state:
+            return
+
+        self._attr_available = device["online"]
+
+        if self.hass and self.entity_id:
+            self.async_write_ha_state()
+
     # ADDITIONAL CLASS FUNCTION
 
     @property
@@ -296,7 +309,7 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
             return
 
         try:
-            config, _ = await self.quasar.get_device_config(self.device)
+            config, _ = await self.quasar.get_device_config(self.device, cached=True)
             self.hdmi_audio = config.get("hdmiAudio", False)
         except:
             _LOGGER.warning("Не получается получить настройки HDMI")
@@ -323,13 +336,14 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         if self.hdmi_audio == enabled:
             return
 
-        try:
-            config, version = await self.quasar.get_device_config(self.device)
+        def modify(config: dict):
             if enabled:
                 config["hdmiAudio"] = True
             else:
                 config.pop("hdmiAudio", None)
-            await self.quasar.set_device_config(self.device, config, version)
+
+        try:
+            await self.quasar.modify_device_config(self.device, modify)
         except:
             _LOGGER.warning("Не получается изменить настройки HDMI")
             return
@@ -372,41 +386,41 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         )
 
     async def _set_led(self, **kwargs):
-        config, version = await self.quasar.get_device_config(self.device)
-
-        led: dict = config.setdefault("led", {})
-
-        if "brightness" in kwargs:
-            if self.device_platform not in (
-                "yandexstation_2",
-                "yandexmini_2",
-                "cucumber",
-                "plum",
-                "bergamot",
-                "orion",
-            ):
-                raise HomeAssistantError("Поддерживаются только станции с часами")
-
-            brightness = led.setdefault("brightness", {"auto": True, "value": 0.5})
-
-            if 0 <= (value := float(kwargs["brightness"])) <= 1:
-                brightness["auto"] = False
-                brightness["value"] = value
-            else:
-                brightness["auto"] = True
+        def modify(config: dict):
+            led: dict = config.setdefault("led", {})
+
+            if "brightness" in kwargs:
+                if self.device_platform not in (
+                    "yandexstation_2",
+                    "yandexmini_2",
+                    "cucumber",
+                    "plum",
+                    "bergamot",
+                    "orion",
+                ):
+                    raise HomeAssistantError("Поддерживаются только станции с часами")
 
-        # https://github.com/AlexxIT/YandexStation/issues/697
-        if "visualization" in kwargs:
-            if self.device_platform not in ("yandexstation_2", "orion"):
-                raise HomeAssistantError("Поддерживаются только станции с экраном")
+                brightness = led.setdefault("brightness", {"auto": True, "value": 0.5})
 
-            visualization = led.setdefault(
-                "music_equalizer_visualization", {"style": "showClock", "auto": False}
-            )
-            # auto - true, clock - false
-            visualization["auto"] = kwargs["visualization"] != "clock"
+                if 0 <= (value := float(kwargs["brightness"])) <= 1:
+                    brightness["auto"] = False
+                    brightness["value"] = value
+                else:
+                    brightness["auto"] = True
 
-        await self.quasar.set_device_config(self.device, config, version)
+            # https://github.com/AlexxIT/YandexStation/issues/697
+            if "visualization" in kwargs:
+                if self.device_platform not in ("yandexstation_2", "orion"):
+                    raise HomeAssistantError("Поддерживаются только станции с экраном")
+
+                visualization = led.setdefault(
+                    "music_equalizer_visualization",
+                    {"style": "showClock", "auto": False},
+                )
+                # auto - true, clock - false
+                visualization["auto"] = kwargs["visualization"] != "clock"
+
+        await self.quasar.modify_device_config(self.device, modify)
 
     async def _set_dnd_mode(self, value: str):
         if value == "True":
@@ -416,13 +430,14 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         else:
             return
 
-        config, version = await self.quasar.get_device_config(self.device)
-
-        if config.get("dndMode") is None:
-            raise HomeAssistantError("Режим 'не беспокоить' не поддерживается этим устройством")
+        def modify(config: dict):
+            if config.get("dndMode") is None:
+                raise HomeAssistantError(
+                    "Режим 'не беспокоить' не поддерживается этим устройством"
+                )
+            config["dndMode"]["enabled"] = value
 
-        config["dndMode"]["enabled"] = value
-        await self.quasar.set_device_config(self.device, config, version)
+        await self.quasar.modify_device_config(self.device, modify)
 
     async def _set_beta(self, value: str):
         if value == "True":
@@ -432,21 +447,20 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         else:
             return
 
-        config, version = await self.quasar.get_device_config(self.device)
-        config["beta"] = value
-        await self.quasar.set_device_config(self.device, config, version)
+        await self.quasar.modify_device_config(
+            self.device, lambda config: config.update(beta=value)
+        )
 
     async def _set_locale(self, value: str):
         assert value in ("ru-RU", "en-US", "ar-SA", "kk-KZ", "tr-TR")
 
-        config, version = await self.quasar.get_device_config(self.device)
-        config["locale"] = value
-        await self.quasar.set_device_config(self.device, config, version)
+        await self.quasar.modify_device_config(
+            self.device, lambda config: config.update(locale=value)
+        )
 
     async def _set_settings(self, value: str):
         data = yaml.safe_load(value)
-        for k, v in data.items():
-            await self.quasar.set_account_config(k, v)
+        await self.quasar.set_account_configs(data)
 
     def _check_set_alice_volume(self, volume: int):
         # если уже есть активная громкость, или громкость голоса равна текущей
@@ -541,7 +555,7 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
             self._attr_media_series_title = None
             self._attr_media_title = None
             self._attr_repeat = None
-            self._attr_should_poll = True
+            self._attr_available = self.device.get("online", False)
             self._attr_shuffle = None
             self._attr_supported_features = CLOUD_FEATURES
 
@@ -570,7 +584,6 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         # default attributes for local mode
         self._attr_assumed_state = False
         self._attr_available = True
-        self._attr_should_poll = False
         self._attr_supported_features = LOCAL_FEATURES
 
         # optional attributes for local mode
@@ -668,6 +681,18 @@ class YandexStationBase(MediaBrowser, RestoreEntity):
         return RestoredExtraData({"sound_mode": self._attr_sound_mode})
 
     async def async_added_to_hass(self):
+        # same subscriptions as in __init__, but removed together with entity
+        for signal, target in (
+            (self.device["id"], self.on_update),
+            (self.device["id"] + "/online", self.on_online),
+        ):
+            self.async_on_remove(self.quasar.subscribe_update(signal, target))
+
+        # index for send_command service
+        entities: dict = self.hass.data[DOMAIN][DATA_ENTITIES]
+        entities[entity_id := self.entity_id] = self
+        self.async_on_remove(lambda: entities.pop(entity_id, None))
+
         if extra_data := await self.async_get_last_extra_data():
             data = extra_data.as_dict()
             self._attr_sound_mode = data["sound_mode"]
@@ -1175,7 +1200,6 @@ class YandexModule(YandexStationBase):
         super().__init__(quasar, device)
 
         self._attr_available = False
-        self._attr_should_poll = False
 
         # both yandex modules don't support music sync
         if self.device_platform == "yandexmodule":
@@ -1194,6 +1218,9 @@ class YandexModule(YandexStationBase):
         if self._attr_available and self.local_state is None:
             self._attr_available = False
 
+    def on_online(self, device: dict):
+        pass
+
     async def async_update(self):
         pass
 
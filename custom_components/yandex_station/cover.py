@@ -13,8 +13,9 @@ INCLUDE_TYPES = ("devices.types.openable.curtain",)
 async def async_setup_entry(hass, entry, async_add_entities):
     async_add_entities(
         YandexCover(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
 
 
@@ -14,6 +14,7 @@ async def async_get_config_entry_diagnostics(
 
     info = get_diagnostics(hass, config_entry)
     info["device"] = quasar.devices
+    info["updates"] = quasar.updates_status
     return info
 
 
@@ -31,6 +32,8 @@ async def async_get_device_diagnostics(
 
     info = get_diagnostics(hass, config_entry)
     info["device"] = device
+    if glagol := getattr(device.get("entity"), "glagol", None):
+        info["local"] = glagol.stats.as_dict()
     return info
 
 
@@ -48,4 +51,8 @@ def get_diagnostics(hass: HomeAssistant, config_entry: ConfigEntry) -> dict:
         device["id"] for _, device, _ in hass_utils.incluce_devices(hass, config_entry)
     ]
 
-    return {"errors": errors, "include": include}
+    quasar: YandexQuasar = hass.data[DOMAIN][config_entry.unique_id]
+    breakers = {k: v.as_dict() for k, v in quasar.session.breakers.items()}
+    http = {k: v.as_dict() for k, v in quasar.session.stats.items()}
+
+    return {"errors": errors, "include": include, "breakers": breakers, "http": http}
@@ -6,7 +6,7 @@ from homeassistant.const import CONF_INCLUDE
 from homeassistant.core import HomeAssistant
 
 from ..climate import INCLUDE_TYPES as CLIMATE
-from ..core.const import DATA_CONFIG, DOMAIN
+from ..core.const import DATA_CONFIG, DATA_INCLUDES, DOMAIN
 from ..core.entity import extract_instance
 from ..core.yandex_quasar import YandexQuasar
 from ..cover import INCLUDE_TYPES as COVER
@@ -52,38 +52,118 @@ INCLUDE_SKIP_INSTANCES = {
 }
 
 
+# {device type: skip instances}
+INCLUDE_SKIP_BY_TYPE = {
+    device_type: include_skip
+    for include_types, include_skip in INCLUDE_SKIP_INSTANCES.items()
+    for device_type in include_types
+}
+
+
+class IncludeIndex:
+    """Included devices of config entry, matched once and grouped by device
+    types of each platform.
+    """
+
+    def __init__(self, quasar: YandexQuasar, includes: list):
+        self.source = quasar.devices
+        self.source_len = len(quasar.devices)
+        self.includes = includes
+        self.devices = match_includes(quasar, includes)
+        self.buckets: dict[tuple, list] = {}
+
+    def is_actual(self, quasar: YandexQuasar, includes: list) -> bool:
+        return (
+            self.source is quasar.devices
+            and self.source_len == len(quasar.devices)
+            and self.includes == includes
+        )
+
+    def bucket(self, include_types: tuple) -> list[tuple[YandexQuasar, dict, dict]]:
+        if (bucket := self.buckets.get(include_types)) is None:
+            types = set(include_types)
+            self.buckets[include_types] = bucket = [
+                i for i in self.devices if i[1]["type"] in types
+            ]
+        return bucket
+
+
 def incluce_devices(
-    hass: HomeAssistant, config_entry: ConfigEntry
+    hass: HomeAssistant, config_entry: ConfigEntry, include_types: tuple = None
 ) -> list[tuple[YandexQuasar, dict, dict]]:
     quasar: YandexQuasar = hass.data[DOMAIN][config_entry.unique_id]
     config: dict = hass.data[DOMAIN][DATA_CONFIG]
     # config_entry has more priority
     includes = config_entry.options.get(CONF_INCLUDE, []) + config.get(CONF_INCLUDE, [])
 
+    # will be rebuilt after options or devices list change
+    indexes: dict[str, IncludeIndex] = hass.data[DOMAIN][DATA_INCLUDES]
+    index = indexes.get(config_entry.unique_id)
+    if not index or not index.is_actual(quasar, includes):
+        indexes[config_entry.unique_id] = index = IncludeIndex(quasar, includes)
+
+    return index.devices if include_types is None else index.bucket(include_types)
+
+
+def match_includes(
+    quasar: YandexQuasar, includes: list
+) -> list[tuple[YandexQuasar, dict, dict]]:
+    # include position by device id or name
+    str_includes: dict[str, int] = {}
+    # dict include positions by id or name, and all others
+    dict_includes: dict[str, list[int]] = {}
+    other_includes: list[int] = []
+
+    for i, conf in enumerate(includes):
+        if isinstance(conf, str):
+            str_includes.setdefault(conf, i)
+        elif isinstance(conf, dict):
+            if key := conf.get("id") or conf.get("name"):
+                dict_includes.setdefault(key, []).append(i)
+            else:
+                other_includes.append(i)
+
     devices = []
 
-    # первый цикл по devices, второй по include, чтоб одинаковые include работали на
-    # разные devices
+    # одинаковые include работают на разные devices, при нескольких подходящих
+    # include выигрывает первый
     for device in quasar.devices:
-        for conf in includes:
-            if isinstance(conf, str):
-                if conf == device["id"] or conf == device["name"]:
-                    conf = build_include_config(device)
-                    devices.append((quasar, device, conf))
-                    break
-            elif isinstance(conf, dict):
-                if all(conf[k] == device.get(k) for k in INCLUDE_KEYS if k in conf):
-                    devices.append((quasar, device, conf))
-                    break
+        positions = [
+            i
+            for key in (device["id"], device["name"])
+            for i in dict_includes.get(key, [])
+        ] + other_includes
+        pos = min(
+            (
+                i
+                for i in positions
+                if all(
+                    includes[i][k] == device.get(k)
+                    for k in INCLUDE_KEYS
+                    if k in includes[i]
+                )
+            ),
+            default=None,
+        )
+
+        for key in (device["id"], device["name"]):
+            if (i := str_includes.get(key)) is not None and (pos is None or i < pos):
+                pos = i
+
+        if pos is None:
+            continue
+
+        conf = includes[pos]
+        if isinstance(conf, str):
+            conf = build_include_config(device)
+        devices.append((quasar, device, conf))
 
     return devices
 
 
 def build_include_config(device: dict) -> dict:
-    for include_types, include_skip in INCLUDE_SKIP_INSTANCES.items():
-        if device["type"] in include_types:
-            break
-    else:
+    include_skip = INCLUDE_SKIP_BY_TYPE.get(device["type"])
+    if include_skip is None:
         return {}
 
     caps = [extract_instance(i) for i in device["capabilities"]]
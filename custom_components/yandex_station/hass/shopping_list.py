@@ -1,6 +1,8 @@
+import asyncio
 import logging
 import re
 import uuid
+import weakref
 
 from homeassistant.components.shopping_list import ShoppingData
 from homeassistant.core import HomeAssistant
@@ -17,30 +19,58 @@ _LOGGER = logging.getLogger(__package__)
 RE_SHOPPING = re.compile(r"^\d+\) (.+)$", re.MULTILINE)
 
 
-def shopping_for_remove(shopping_data: ShoppingData, alice_data: str) -> list[str]:
-    alice_items = RE_SHOPPING.findall(alice_data)
-    for_remove = [
-        alice_items.index(item["name"])
-        for item in shopping_data.items
-        if item["complete"] and item["name"] in alice_items
-    ]
-    return [str(i + 1) for i in sorted(for_remove)]
+class ShoppingState:
+    """Состояние синхронизации списка покупок одного аккаунта."""
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.next: asyncio.Task | None = None  # queued sync
+        self.alice_text: str | None = None  # last known Alice list
+        self.items: list | None = None  # last synced Hass list
+
+
+# {YandexSession: ShoppingState}
+STATES = weakref.WeakKeyDictionary()
+
+
+def shopping_snapshot(shopping_data: ShoppingData) -> list:
+    return [(item["name"], item["complete"]) for item in shopping_data.items]
+
 
+def shopping_diff(
+    shopping_data: ShoppingData, alice_items: list[str]
+) -> tuple[list[int], list[str]]:
+    """Returns Alice indexes for remove and Hass names for add."""
+    alice_indexes = {name: i for i, name in enumerate(alice_items)}
 
-def shopping_for_add(shopping_data: ShoppingData, alice_data: str) -> list[str]:
-    alice_items = RE_SHOPPING.findall(alice_data)
+    for_remove = set()
+    for_add = []
+
+    for item in shopping_data.items:
+        name = item["name"]
+        if item["complete"]:
+            if name in alice_indexes:
+                for_remove.add(alice_indexes[name])
+        elif name not in alice_indexes and not item["id"].startswith("alice"):
+            for_add.append(name)
+
+    return sorted(for_remove), for_add
+
+
+def shopping_remove_commands(for_remove: list[int], size: int = 5) -> list[str]:
+    """Removes items starting from the end of the list, so the numbers of the
+    remaining items won't change and there is no need to reload the list.
+    """
+    for_remove = sorted(for_remove, reverse=True)
     return [
-        item["name"]
-        for item in shopping_data.items
-        if not item["complete"]
-        and item["name"] not in alice_items
-        and not item["id"].startswith("alice")
+        "Удали " + ", ".join(str(i + 1) for i in sorted(for_remove[i : i + size]))
+        for i in range(0, len(for_remove), size)
     ]
 
 
-def shopping_save(hass: HomeAssistant, shopping_data: ShoppingData, alice_data: str):
-    alice_items = RE_SHOPPING.findall(alice_data)
-
+def shopping_save(
+    hass: HomeAssistant, shopping_data: ShoppingData, alice_items: list[str]
+):
     new_items = {
         name: {"name": name, "id": f"alice{uuid.uuid4().hex}", "complete": False}
         for name in alice_items
@@ -71,28 +101,56 @@ async def shopping_sync(hass: HomeAssistant, glagol: YandexGlagol):
     if not entries:
         return
 
-    try:
-        # magic for support new version after HA 2026.5 and old version
-        data = getattr(entries[0], "runtime_data", hass.data.get("shopping_list"))
+    state = STATES.get(glagol.session)
+    if state is None:
+        STATES[glagol.session] = state = ShoppingState()
 
-        payload = {"command": "sendText", "text": "Что в списке покупок"}
-        card = await glagol.send(payload)
+    # all triggers during running sync will be served by one next sync
+    if not state.next or state.next.done():
+        state.next = asyncio.create_task(shopping_sync_locked(hass, glagol, state))
 
-        while for_remove := shopping_for_remove(data, card["text"]):
-            # не удаляет больше 5 элементов за раз
-            text = "Удали " + ", ".join(for_remove[:5])
-            await glagol.send({"command": "sendText", "text": text})
-            # обновим после изменений
+    await asyncio.shield(state.next)
+
+
+async def shopping_sync_locked(
+    hass: HomeAssistant, glagol: YandexGlagol, state: ShoppingState
+):
+    async with state.lock:
+        state.next = None
+
+        try:
+            # magic for support new version after HA 2026.5 and old version
+            entries = hass.config_entries.async_entries("shopping_list")
+            data = getattr(entries[0], "runtime_data", hass.data.get("shopping_list"))
+
+            payload = {"command": "sendText", "text": "Что в списке покупок"}
             card = await glagol.send(payload)
 
-        if for_add := shopping_for_add(data, card["text"]):
+            # nothing changed on both sides since last sync
+            if (
+                card["text"] == state.alice_text
+                and shopping_snapshot(data) == state.items
+            ):
+                return
+
+            for_remove, for_add = shopping_diff(data, RE_SHOPPING.findall(card["text"]))
+
+            # не удаляет больше 5 элементов за раз
+            for text in shopping_remove_commands(for_remove):
+                await glagol.send({"command": "sendText", "text": text})
+
             for item in for_add:
                 # плохо работает, если добавлять всё сразу через запятую
                 text = f"Добавь в список покупок {item}"
                 await glagol.send({"command": "sendText", "text": text})
-            # обновим после изменений
-            card = await glagol.send(payload)
 
-        shopping_save(hass, data, card["text"])
-    except Exception as e:
-        _LOGGER.error("shopping_sync", exc_info=e)
+            if for_remove or for_add:
+                # обновим после изменений
+                card = await glagol.send(payload)
+
+            shopping_save(hass, data, RE_SHOPPING.findall(card["text"]))
+
+            state.alice_text = card["text"]
+            state.items = shopping_snapshot(data)
+        except Exception as e:
+            _LOGGER.error("shopping_sync", exc_info=e)
@@ -1,9 +1,11 @@
+import asyncio
 import logging
 import re
 
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers.storage import Store
 
+from .shopping_list import shopping_remove_commands
 from ..core.yandex_glagol import YandexGlagol
 
 _LOGGER = logging.getLogger(__package__)
@@ -13,6 +15,9 @@ RE_TODO = re.compile(r"^\d+\) (.+)$", re.MULTILINE)
 STORE_VERSION = 1
 STORE_KEY = "yandex_station.todo"
 
+# parallel todo.add_item calls
+TODO_CONCURRENCY = 4
+
 
 async def get_todo_items(hass: HomeAssistant, entity_id: str) -> list[dict]:
     response = await hass.services.async_call(
@@ -34,72 +39,69 @@ async def get_todo_items(hass: HomeAssistant, entity_id: str) -> list[dict]:
     return data.get("items", [])
 
 
-def todo_for_remove(
-    todo_items: list[dict], alice_data: str, previous_alice_items: set[str]
-) -> list[str]:
-    alice_items = RE_TODO.findall(alice_data)
+def todo_diff(
+    todo_items: list[dict], alice_items: list[str], previous_alice_items: set[str]
+) -> tuple[list[int], list[str]]:
+    """Returns Alice indexes for remove and ToDo summaries for add."""
+    alice_indexes = {item: i for i, item in enumerate(alice_items)}
 
     current_todo_items = {
         item.get("summary") for item in todo_items if item.get("summary")
     }
 
-    for_remove = []
-    alice_indexes = {item: i for i, item in enumerate(alice_items)}
+    for_remove = set()
+    for_add = []
 
-    # Помечены как завершенные
     for item in todo_items:
         summary = item.get("summary")
-        if summary and item.get("status") == "completed" and summary in alice_items:
-            for_remove.append(alice_indexes[summary])
-
-    # Удалены пользователем из ToDo
-    for summary in previous_alice_items - current_todo_items:
-        if summary in alice_items:
-            for_remove.append(alice_indexes[summary])
-
-    return [str(i + 1) for i in sorted(set(for_remove))]
-
-
-async def todo_for_add(
-    todo_items: list[dict], alice_data: str, previous_alice_items: set[str]
-) -> list[str]:
-    alice_items = set(RE_TODO.findall(alice_data))
-
-    result = []
-
-    for item in todo_items:
-        status = item.get("status", "needs_action")
-        summary = item.get("summary")
-
-        if status == "completed" or not summary:
+        if not summary:
             continue
 
-        # Элемент уже есть у Алисы
-        if summary in alice_items:
+        if item.get("status", "needs_action") == "completed":
+            # Помечены как завершенные
+            if summary in alice_indexes:
+                for_remove.add(alice_indexes[summary])
             continue
 
-        # Раньше был у Алисы, но пользователь удалил
-        if summary in previous_alice_items:
+        # Элемент уже есть у Алисы или раньше был у Алисы, но пользователь удалил
+        if summary in alice_indexes or summary in previous_alice_items:
             continue
 
-        result.append(summary)
-
-    return result
+        for_add.append(summary)
 
+    # Удалены пользователем из ToDo
+    for summary in previous_alice_items - current_todo_items:
+        if summary in alice_indexes:
+            for_remove.add(alice_indexes[summary])
 
-async def todo_save(hass: HomeAssistant, entity_id: str, alice_data: str) -> None:
-    alice_items = set(RE_TODO.findall(alice_data))
-
-    items = await get_todo_items(hass, entity_id)
-
-    existing = {item.get("summary"): item for item in items if item.get("summary")}
+    return sorted(for_remove), for_add
 
-    # Удаляем отсутствующие
-    for summary, item in existing.items():
-        if summary not in alice_items:
-            uid = item.get("uid") or item.get("id") or item.get("item_id")
 
-            if uid:
+async def todo_save(
+    hass: HomeAssistant, entity_id: str, todo_items: list[dict], alice_items: list[str]
+) -> None:
+    alice_set = set(alice_items)
+
+    existing = {item["summary"]: item for item in todo_items if item.get("summary")}
+
+    # Удаляем отсутствующие одним вызовом
+    for_remove = [
+        uid
+        for summary, item in existing.items()
+        if summary not in alice_set
+        and (uid := item.get("uid") or item.get("id") or item.get("item_id"))
+    ]
+    if for_remove:
+        try:
+            await hass.services.async_call(
+                "todo",
+                "remove_item",
+                {"entity_id": entity_id, "item": for_remove},
+                blocking=True,
+            )
+        except Exception:
+            # одного отсутствующего элемента достаточно для ошибки всего вызова
+            for uid in for_remove:
                 try:
                     await hass.services.async_call(
                         "todo",
@@ -108,11 +110,13 @@ async def todo_save(hass: HomeAssistant, entity_id: str, alice_data: str) -> Non
                         blocking=True,
                     )
                 except Exception:
-                    _LOGGER.exception("Failed to remove todo item: %s", summary)
+                    _LOGGER.exception("Failed to remove todo item: %s", uid)
 
-    # Добавляем новые
-    for summary in alice_items:
-        if summary not in existing:
+    # Добавляем новые, todo.add_item поддерживает только один элемент
+    semaphore = asyncio.Semaphore(TODO_CONCURRENCY)
+
+    async def add_item(summary: str):
+        async with semaphore:
             try:
                 await hass.services.async_call(
                     "todo",
@@ -123,12 +127,17 @@ async def todo_save(hass: HomeAssistant, entity_id: str, alice_data: str) -> Non
             except Exception:
                 _LOGGER.exception("Failed to add todo item: %s", summary)
 
+    for_add = [
+        summary for summary in dict.fromkeys(alice_items) if summary not in existing
+    ]
+    await asyncio.gather(*[add_item(summary) for summary in for_add])
+
 
 async def shopping_sync(
     hass: HomeAssistant, glagol: YandexGlagol, entity_id: str
 ) -> None:
     try:
-        # Элементы из списка Home Assistant
+        # Элементы из списка Home Assistant, один снимок на всю синхронизацию
         items = await get_todo_items(hass, entity_id)
 
         payload = {"command": "sendText", "text": "Что в списке покупок"}
@@ -140,28 +149,31 @@ async def shopping_sync(
         # Элементы ранее синхронизированные с алисой
         previous_alice_items = set(store_data.get(entity_id) or [])
 
-        # Удаляем выполненные
-        while for_remove := todo_for_remove(items, card["text"], previous_alice_items):
-            # Не удаляет больше 2-х элементов за раз
+        for_remove, for_add = todo_diff(
+            items, RE_TODO.findall(card["text"]), previous_alice_items
+        )
+
+        # Удаляем выполненные с конца списка, номера остальных не меняются
+        # Не удаляет больше 2-х элементов за раз
+        for text in shopping_remove_commands(for_remove, 2):
+            await glagol.send({"command": "sendText", "text": text})
+
+        # Добавляем новые элементы в список по одному
+        for item in for_add:
             await glagol.send(
-                {"command": "sendText", "text": "Удали " + ", ".join(for_remove[:2])}
+                {"command": "sendText", "text": f"Добавь в список покупок {item}"}
             )
-            card = await glagol.send(payload)
 
-        # Добавляем новые элементы в список по одному
-        if for_add := await todo_for_add(items, card["text"], previous_alice_items):
-            for item in for_add:
-                await glagol.send(
-                    {"command": "sendText", "text": f"Добавь в список покупок {item}"}
-                )
+        if for_remove or for_add:
             card = await glagol.send(payload)
 
+        alice_items = RE_TODO.findall(card["text"])
+
         # Сохраняем изменения из Алисы в ToDo
-        await todo_save(hass, entity_id, card["text"])
+        await todo_save(hass, entity_id, items, alice_items)
 
         # Обновляем Store
-        current_alice_items = set(RE_TODO.findall(card["text"]))
-        store_data[entity_id] = current_alice_items
+        store_data[entity_id] = list(set(alice_items))
         await store.async_save(store_data)
 
         # Остановим алису
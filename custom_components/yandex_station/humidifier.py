@@ -17,8 +17,9 @@ INCLUDE_TYPES = ("devices.types.humidifier",)
 async def async_setup_entry(hass, entry, async_add_entities):
     async_add_entities(
         YandexHumidifier(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
 
 
@@ -53,6 +54,7 @@ class YandexHumidifier(HumidifierEntity, YandexEntity):
             self._attr_current_humidity = properties["humidity"]
 
     async def async_added_to_hass(self):
+        await super().async_added_to_hass()
         if item := self.config.get("current_humidity"):
             on_remove = utils.track_template(self.hass, item, self.on_track_template)
             self.async_on_remove(on_remove)
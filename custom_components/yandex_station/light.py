@@ -18,8 +18,9 @@ INCLUDE_TYPES = (
 async def async_setup_entry(hass, entry, async_add_entities):
     async_add_entities(
         YandexLight(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
 
 
@@ -93,7 +94,11 @@ class YandexLight(LightEntity, YandexEntity):
             if self.on_instance is None:
                 self._attr_is_on = bool(self.brightness)
 
-        if animation := capabilities.get("color_animation"):
+        # animation has priority over color, so check both with last values
+        if "color_animation" not in capabilities and "color" not in capabilities:
+            return
+
+        if animation := self.capabilities.get("color_animation"):
             animation_type = animation["current_animation_type"]
             if animation_type == "color":
                 color = animation["animations"]["color"]
@@ -109,7 +114,7 @@ class YandexLight(LightEntity, YandexEntity):
                     i["name"] for i in self.effects if i["id"] == id
                 )
 
-        elif color := capabilities.get("color"):
+        elif color := self.capabilities.get("color"):
             value = color.get("value")
 
             if isinstance(value, dict):
@@ -1,5 +1,4 @@
 import logging
-from datetime import timedelta
 
 from homeassistant.components.media_player import (
     MediaPlayerDeviceClass,
@@ -18,9 +17,6 @@ from .hass import hass_utils
 
 _LOGGER = logging.getLogger(__name__)
 
-# update speaker online state once per 5 minutes
-SCAN_INTERVAL = timedelta(minutes=5)
-
 INCLUDE_TYPES = (
     "devices.types.media_device",
     "devices.types.media_device.receiver",
@@ -45,8 +41,9 @@ async def async_setup_entry(hass, entry, async_add_entities):
     # add Quasar TVs
     async_add_entities(
         YandexMediaPlayer(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
 
 
@@ -98,6 +95,7 @@ class YandexMediaPlayer(MediaPlayerEntity, YandexEntity):
             )
 
     async def async_added_to_hass(self):
+        await super().async_added_to_hass()
         if item := self.config.get("state_template"):
             on_remove = utils.track_template(self.hass, item, self.on_track_template)
             self.async_on_remove(on_remove)
@@ -96,7 +96,7 @@ class YandexEqualizer(SelectEntity):
 
     async def async_update(self):
         try:
-            config, _ = await self.quasar.get_device_config(self.device)
+            config, _ = await self.quasar.get_device_config(self.device, cached=True)
             if eq := config.get("equalizer"):
                 self._attr_current_option = (
                     eq["active_preset_id"] if eq["enabled"] else "off"
@@ -110,9 +110,7 @@ class YandexEqualizer(SelectEntity):
             _LOGGER.warning("Не удалось загрузить эквалайзер", exc_info=e)
 
     async def async_select_option(self, option: str):
-        try:
-            config, version = await self.quasar.get_device_config(self.device)
-
+        def modify(config: dict):
             eq: dict = config.get("equalizer")
             if not eq:
                 # init default equalizer
@@ -139,7 +137,8 @@ class YandexEqualizer(SelectEntity):
             else:
                 eq["enabled"] = False
 
-            await self.quasar.set_device_config(self.device, config, version)
+        try:
+            await self.quasar.modify_device_config(self.device, modify)
 
             self._attr_current_option = option
             self._async_write_ha_state()
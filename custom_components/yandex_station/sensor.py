@@ -17,10 +17,14 @@ from homeassistant.const import (
     UnitOfPower,
     UnitOfPressure,
     UnitOfTemperature,
+    UnitOfTime,
     UnitOfVolume,
 )
+from homeassistant.helpers.entity import DeviceInfo, EntityCategory
 
+from .core.const import CONF_HTTP_STATS, CONF_LOCAL_STATS, DATA_CONFIG, DOMAIN
 from .core.entity import YandexCustomEntity
+from .core.yandex_session import YandexSession
 from .hass import hass_utils
 
 _LOGGER = logging.getLogger(__name__)
@@ -167,6 +171,14 @@ async def async_setup_entry(hass, entry, async_add_entities):
             if instance["parameters"]["instance"] in instances:
                 entities.append(YandexCustomSensor(quasar, device, instance))
 
+    config = hass.data[DOMAIN][DATA_CONFIG]
+    quasar = hass.data[DOMAIN][entry.unique_id]
+    if config.get(CONF_HTTP_STATS):
+        entities.append(YandexHTTPStatsSensor(quasar.session, entry.unique_id))
+    if config.get(CONF_LOCAL_STATS):
+        for device in quasar.speakers + quasar.modules:
+            entities.append(YandexLocalStatsSensor(device))
+
     async_add_entities(entities)
 
 
@@ -189,3 +201,63 @@ class YandexCustomSensor(SensorEntity, YandexCustomEntity):
     def internal_update(self, capabilities: dict, properties: dict):
         if self.instance in properties:
             self._attr_native_value = properties[self.instance]
+
+
+class YandexHTTPStatsSensor(SensorEntity):
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_icon = "mdi:cloud-sync"
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, session: YandexSession, unique_id: str):
+        self.session = session
+        self._attr_name = f"Yandex HTTP requests {unique_id}"
+        self._attr_unique_id = f"{unique_id}_http_stats"
+
+    async def async_update(self):
+        # in event loop, session adds stats for new hosts there
+        self._attr_native_value = sum(i.requests for i in self.session.stats.values())
+        # short stats, full histograms available in diagnostics
+        self._attr_extra_state_attributes = {
+            family: {
+                "requests": stats.requests,
+                "errors": stats.errors,
+                "retries": stats.retries,
+                "in_flight": stats.in_flight,
+                "latency_avg": stats.latency.as_dict()["avg"],
+                "breaker": self.session.breakers[family].state,
+            }
+            for family, stats in self.session.stats.items()
+        }
+
+
+class YandexLocalStatsSensor(SensorEntity):
+    _attr_device_class = SENSOR.DURATION
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, device: dict):
+        self.device = device
+        did = device["quasar_info"]["device_id"]
+        self._attr_device_info = DeviceInfo(identifiers={(DOMAIN, did)})
+        self._attr_name = device["name"] + " local RTT"
+        self._attr_unique_id = f"{did}_local_stats"
+
+    async def async_update(self):
+        glagol = getattr(self.device.get("entity"), "glagol", None)
+        if not glagol:
+            self._attr_native_value = None
+            self._attr_extra_state_attributes = None
+            return
+
+        stats = glagol.stats.as_dict()
+        avg = stats["rtt"]["avg"]
+        self._attr_native_value = round(avg * 1000) if avg is not None else None
+        # short stats, full histograms available in diagnostics
+        self._attr_extra_state_attributes = {
+            "frame_interval_avg": stats["frames"]["avg"],
+            "connects": stats["connects"],
+            "disconnects": stats["disconnects"],
+            "timeouts": stats["timeouts"],
+            "cloud_time": stats["cloud_time"],
+        }
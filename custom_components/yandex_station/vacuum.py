@@ -42,8 +42,9 @@ except ImportError:
 async def async_setup_entry(hass, entry, async_add_entities):
     async_add_entities(
         YandexVacuum(quasar, device, config)
-        for quasar, device, config in hass_utils.incluce_devices(hass, entry)
-        if device["type"] in INCLUDE_TYPES
+        for quasar, device, config in hass_utils.incluce_devices(
+            hass, entry, INCLUDE_TYPES
+        )
     )
 
 
@@ -19,6 +19,47 @@ class FakeQuasar(YandexQuasar):
         pass
 
 
+class FakeResponse:
+    def __init__(self, data=None, status: int = 200, headers: dict = None):
+        self.data = data
+        self.status = status
+        self.headers = headers or {}
+
+    async def json(self):
+        return self.data
+
+    async def text(self):
+        return self.data
+
+
+class FakeSession:
+    """Cloud session for YandexQuasar. Handler gets (method, url, **kwargs) and
+    returns response data or FakeResponse.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+
+    async def request(self, method: str, url: str, **kwargs):
+        self.calls.append((method, url))
+        await asyncio.sleep(0)
+        data = self.handler(method, url, **kwargs)
+        return data if isinstance(data, FakeResponse) else FakeResponse(data)
+
+    async def get(self, url: str, **kwargs):
+        return await self.request("get", url, **kwargs)
+
+    async def post(self, url: str, **kwargs):
+        return await self.request("post", url, **kwargs)
+
+    async def put(self, url: str, **kwargs):
+        return await self.request("put", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs):
+        return await self.request("delete", url, **kwargs)
+
+
 class FakeYandexStation(YandexStationBase):
     def __init__(self):
         quasar = FakeQuasar()
@@ -1,7 +1,7 @@
 from homeassistant.components.light import ColorMode, LightEntityFeature
 
 from custom_components.yandex_station.light import YandexLight
-from . import false, null, true, update_ha_state
+from . import FakeQuasar, false, null, true, update_ha_state
 
 
 def fix_hass_2024_12(state):
@@ -893,3 +893,52 @@ def test_strip():
         "supported_features": LightEntityFeature.EFFECT,
         # "xy_color": None,
     }
+
+
+def test_color_animation_priority():
+    def color(value: dict) -> dict:
+        return {
+            "type": "devices.capabilities.color_setting",
+            "retrievable": true,
+            "parameters": {
+                "instance": "color",
+                "palette": [{"id": "red", "name": "Красный"}],
+            },
+            "state": {"instance": "color", "value": value},
+        }
+
+    animation = {
+        "type": "devices.capabilities.color_setting",
+        "retrievable": true,
+        "parameters": {"instance": "color_animation"},
+        "state": {
+            "instance": "color_animation",
+            "value": {
+                "current_animation_type": "color",
+                "animations": {
+                    "color": {
+                        "internal_state": {
+                            "instance": "hsv",
+                            "value": {"h": 120, "s": 100, "v": 100},
+                        }
+                    }
+                },
+            },
+        },
+    }
+
+    device = {
+        "id": "ID",
+        "name": "NAME",
+        "state": "online",
+        "capabilities": [color({"h": 0, "s": 100, "v": 100}), animation],
+        "properties": [],
+    }
+
+    light = YandexLight(FakeQuasar(device), device)
+    assert light.hs_color == (120, 100)
+
+    # only color changed, but unchanged animation still has priority
+    device["capabilities"][0] = color({"h": 240, "s": 100, "v": 100})
+    light.on_update(device)
+    assert light.hs_color == (120, 100)
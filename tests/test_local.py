@@ -1,3 +1,7 @@
+import asyncio
+import time
+
+from aiohttp import ServerTimeoutError, WSMessage, WSMsgType
 from homeassistant.components.media_player import (
     MediaPlayerEntityFeature,
     MediaPlayerState,
@@ -5,7 +9,12 @@ from homeassistant.components.media_player import (
     RepeatMode,
 )
 
-from . import FakeYandexStation
+from custom_components.yandex_station.core import yandex_glagol
+from custom_components.yandex_station.core.yandex_glagol import GlagolStats
+
+from custom_components.yandex_station.core.yandex_station import YandexStationBase
+
+from . import FakeQuasar, FakeYandexStation
 
 
 def test_idle():
@@ -489,3 +498,216 @@ def test_movie():
     assert entity.media_content_type == MediaType.TVSHOW
     assert entity.media_series_title == "военный, боевик, история, биография, 18+, 2019"
     assert entity.shuffle is None
+
+
+def test_cloud_online():
+    def station(online: bool) -> YandexStationBase:
+        device = {
+            "id": "",
+            "name": "",
+            "quasar_info": {"device_id": "", "platform": ""},
+            "capabilities": [],
+            "online": online,
+        }
+        return YandexStationBase(FakeQuasar(), device)
+
+    # offline speaker unavailable before any online update
+    assert station(False).available is False
+
+    entity = station(True)
+    assert entity.available is True
+
+    entity.device["online"] = False
+    entity.async_write_ha_state = lambda: None
+    state = {"aliceState": "IDLE", "playing": False, "volume": 0.2}
+    entity.async_set_state({"state": state})
+    assert entity.available is True
+    # back to cloud mode
+    entity.async_set_state(None)
+    assert entity.available is False
+
+
+def test_glagol_stats():
+    stats = GlagolStats()
+    stats.on_connect()
+    stats.sent["req1"] = time.time() - 0.2
+    stats.on_frame()
+    stats.on_frame("req1")
+    stats.on_frame("unknown")
+
+    data = stats.as_dict()
+    assert data["connects"] == 1
+    assert data["rtt"]["count"] == 1
+    assert 0.2 <= data["rtt"]["avg"] < 0.3
+    assert data["frames"]["count"] == 2
+    assert stats.sent == {}
+
+    stats.on_disconnect()
+    stats.cloud_ts -= 5
+    stats.on_frame()
+    assert stats.as_dict()["disconnects"] == 1
+    assert round(stats.cloud_time) == 5
+    # no interval between frames of different connections
+    assert stats.frames.count == 2
+
+    # failed reconnects keep cloud time and aren't disconnects
+    stats.on_connect()
+    stats.on_disconnect()
+    stats.cloud_ts -= 100
+    stats.on_disconnect()
+    data = stats.as_dict()
+    assert data["disconnects"] == 2
+    assert data["cloud_time"] == 105
+
+
+def test_glagol_watchdog(monkeypatch):
+    class FakeWebSocket:
+        closed = False
+
+        def __init__(self, answer_ping: bool):
+            self.answer_ping = answer_ping
+            self.sent = []
+
+        async def receive(self, timeout: float):
+            if self.answer_ping and "ping" in self.sent:
+                return "pong"
+            await asyncio.sleep(timeout)
+            raise asyncio.TimeoutError
+
+        async def send_json(self, data: dict):
+            self.sent.append(data["payload"]["command"])
+
+        async def close(self):
+            self.closed = True
+
+    monkeypatch.setitem(yandex_glagol.WATCHDOG_TIMEOUTS, "test", (0.01, 0.01))
+
+    async def main():
+        device = {"name": "", "quasar_info": {"platform": "test"}}
+        glagol = yandex_glagol.YandexGlagol(None, device)
+
+        glagol.ws = ws = FakeWebSocket(answer_ping=True)
+        assert await glagol._receive() == "pong"
+        assert ws.sent == ["ping"] and not ws.closed
+
+        glagol.ws = ws = FakeWebSocket(answer_ping=False)
+        try:
+            await glagol._receive()
+            assert False
+        except ServerTimeoutError:
+            pass
+        assert ws.sent == ["ping"] and ws.closed
+
+    asyncio.run(main())
+
+
+def test_zeroconf_dedup(monkeypatch):
+    class FakeServiceInfo:
+        host = b"\xc0\xa8\x01\x02"
+
+        def __init__(self, service_type: str, name: str):
+            self.properties = {b"deviceId": b"abc", b"platform": b"yandexstation"}
+            self.addresses = [FakeServiceInfo.host]
+            self.port = 1961
+
+        async def async_request(self, zeroconf, timeout: float):
+            return True
+
+    monkeypatch.setattr(yandex_glagol, "AsyncServiceInfo", FakeServiceInfo)
+
+    found = []
+    listener = yandex_glagol.YandexIOListener(found.append)
+
+    async def main():
+        for _ in range(3):
+            await listener._service_info(None, "_yandexio._tcp.local.", "name")
+        FakeServiceInfo.host = b"\xc0\xa8\x01\x03"
+        await listener._service_info(None, "_yandexio._tcp.local.", "name")
+
+    asyncio.run(main())
+
+    assert [i["host"] for i in found] == ["192.168.1.2", "192.168.1.3"]
+
+
+def test_device_tokens(monkeypatch):
+    calls = []
+
+    async def fetch_device_token(session, device: dict) -> str:
+        calls.append(device["quasar_info"]["device_id"])
+        await asyncio.sleep(0)
+        # JWT with {"exp": 1}
+        return "header.eyJleHAiOiAxfQ.sign" if len(calls) == 1 else "token"
+
+    monkeypatch.setattr(yandex_glagol, "fetch_device_token", fetch_device_token)
+
+    saved = []
+    tokens = yandex_glagol.DeviceTokens()
+    tokens.save_handler = saved.append
+    device = {"name": "", "quasar_info": {"device_id": "abc"}}
+
+    async def main():
+        # first token already expired
+        await tokens.prefetch(None, [device])
+        assert tokens.data["abc"]["expires"] == 1
+        results = await asyncio.gather(*[tokens.fetch(None, device) for _ in range(3)])
+        assert results == ["token"] * 3
+        assert await tokens.fetch(None, device) == "token"
+
+    asyncio.run(main())
+
+    assert calls == ["abc", "abc"]
+    assert tokens.data == {"abc": {"token": "token", "expires": None}}
+    assert len(saved) == 2
+
+    tokens.remove("abc")
+    assert tokens.get("abc") is None
+
+
+def test_stored_address(monkeypatch):
+    class FakeWebSocket:
+        closed = False
+
+        async def receive(self, timeout: float):
+            # another device on the old address closes connection
+            return WSMessage(WSMsgType.CLOSE, None, None)
+
+        async def send_json(self, data: dict):
+            pass
+
+        async def close(self):
+            self.closed = True
+
+    class FakeSession:
+        async def ws_connect(self, url: str, **kwargs):
+            return FakeWebSocket()
+
+    tokens = yandex_glagol.DeviceTokens()
+    monkeypatch.setattr(yandex_glagol.YandexGlagol, "tokens", tokens)
+    # no reconnect task
+    monkeypatch.setattr(yandex_glagol.asyncio, "create_task", lambda coro: coro.close())
+
+    async def main(stored: bool) -> yandex_glagol.YandexGlagol:
+        tokens.data["abc"] = {"token": "token", "expires": None}
+        device = {
+            "name": "",
+            "host": "192.168.1.2",
+            "port": 1961,
+            "quasar_info": {"device_id": "abc", "platform": ""},
+        }
+        if stored:
+            device["stored"] = True
+        glagol = yandex_glagol.YandexGlagol(FakeSession(), device)
+        glagol.url = "wss://192.168.1.2:1961"
+        glagol.update_handler = lambda data: None
+        await glagol._connect(0)
+        return glagol
+
+    # token kept and retries stopped until discovery
+    glagol = asyncio.run(main(stored=True))
+    assert tokens.get("abc") == "token"
+    assert glagol.url is None
+
+    # address from discovery, token rejected
+    glagol = asyncio.run(main(stored=False))
+    assert tokens.get("abc") is None
+    assert glagol.url is not None
@@ -1,9 +1,19 @@
+import asyncio
+import logging
 from datetime import datetime
 
 from homeassistant.components import media_source
 
 from custom_components.yandex_station.core import utils
-from custom_components.yandex_station.hass.shopping_list import RE_SHOPPING
+from custom_components.yandex_station.core.entity import extract_changes
+from custom_components.yandex_station.core.yandex_quasar import YandexQuasar
+from custom_components.yandex_station.hass.hass_utils import match_includes
+from custom_components.yandex_station.hass.shopping_list import (
+    RE_SHOPPING,
+    shopping_diff,
+    shopping_remove_commands,
+)
+from custom_components.yandex_station.hass.todo_list import todo_diff, todo_save
 
 
 def test_media_source():
@@ -43,7 +53,185 @@ def test_shopping_list():
     assert m == ["хлеб", "3 йогурта", "колбаса"]
 
 
+def test_shopping_diff():
+    class ShoppingData:
+        items = [
+            {"name": "хлеб", "id": "alice1", "complete": True},
+            {"name": "молоко", "id": "1", "complete": False},
+            {"name": "сыр", "id": "alice2", "complete": False},
+            {"name": "колбаса", "id": "alice3", "complete": True},
+        ]
+
+    alice_items = ["хлеб", "3 йогурта", "колбаса"]
+    assert shopping_diff(ShoppingData, alice_items) == ([0, 2], ["молоко"])
+
+    # remove from the end, so numbers of other items don't change
+    assert shopping_remove_commands(list(range(7))) == [
+        "Удали 3, 4, 5, 6, 7",
+        "Удали 1, 2",
+    ]
+
+
+def test_todo_diff():
+    todo_items = [
+        {"summary": "хлеб", "uid": "1", "status": "completed"},
+        {"summary": "молоко", "uid": "2", "status": "needs_action"},
+        {"summary": "сыр", "uid": "3", "status": "needs_action"},
+    ]
+    alice_items = ["хлеб", "сыр", "колбаса"]
+    # колбаса was removed by user from ToDo
+    assert todo_diff(todo_items, alice_items, {"сыр", "колбаса"}) == (
+        [0, 2],
+        ["молоко"],
+    )
+
+
+def test_todo_save():
+    calls = []
+
+    class Services:
+        async def async_call(self, domain, service, data, **kwargs):
+            calls.append((service, data["item"]))
+            # one removed item fails whole call
+            if service == "remove_item" and "2" in data["item"]:
+                raise ValueError
+
+    class Hass:
+        services = Services()
+
+    todo_items = [
+        {"summary": "хлеб", "uid": "1"},
+        {"summary": "молоко", "uid": "2"},
+        {"summary": "сыр", "uid": "3"},
+    ]
+    asyncio.run(todo_save(Hass, "todo.shop", todo_items, ["сыр", "колбаса"]))
+    assert calls == [
+        ("remove_item", ["1", "2"]),
+        ("remove_item", "1"),
+        ("remove_item", "2"),
+        ("add_item", "колбаса"),
+    ]
+
+
 def test_fix_dialog_text():
     src = '<speaker effect="megaphone">Ехал Грека через реку <speaker effect="-">видит Грека в реке рак'
     dst = '<speaker effect="megaphone">ЕХАЛ ГРЕКА ЧЕРЕЗ РЕКУ <speaker effect="-">ВИДИТ ГРЕКА В РЕКЕ РАК'
     assert utils.fix_dialog_text(src) == dst
+
+
+def test_include_devices():
+    quasar = YandexQuasar(None)
+    quasar.devices = [
+        {"id": "1", "name": "Лампа", "type": "devices.types.light", "room_name": "A"},
+        {"id": "2", "name": "Розетка", "type": "devices.types.socket"},
+        {"id": "3", "name": "Лампа", "type": "devices.types.light", "room_name": "B"},
+        {"id": "4", "name": "Датчик", "type": "devices.types.sensor"},
+    ]
+    for device in quasar.devices:
+        device["capabilities"] = device["properties"] = []
+
+    includes = [{"room_name": "B", "type": "devices.types.light"}, "Лампа", "2"]
+    devices = match_includes(quasar, includes)
+    assert [(device["id"], conf) for _, device, conf in devices] == [
+        ("1", {"capabilities": [], "properties": []}),
+        ("2", {}),
+        ("3", includes[0]),
+    ]
+
+
+def test_extract_changes():
+    items = [
+        {
+            "type": "devices.capabilities.on_off",
+            "state": {"instance": "on", "value": True},
+            "parameters": {"split": False},
+        },
+        {
+            "type": "devices.capabilities.range",
+            "state": {"instance": "brightness", "value": 50},
+            "parameters": {"instance": "brightness"},
+        },
+    ]
+    values = {}
+    assert extract_changes(items, values) == {"on": True, "brightness": 50}
+    assert extract_changes(items, values) == {}
+
+    items[1]["state"]["value"] = 70
+    assert extract_changes(items[1:], values) == {"brightness": 70}
+
+
+def test_debug_ring_buffer():
+    debug = utils.YandexDebug.__new__(utils.YandexDebug)
+    debug.records = utils.deque(maxlen=3)
+    for i, level in enumerate((logging.DEBUG, logging.INFO, logging.WARNING) * 2):
+        rec = logging.LogRecord("test", level, "glagol.py", 1, f"msg{i}", None, None)
+        debug.handle(rec)
+
+    assert [i[0] for i in debug.filter_records()] == [4, 5, 6]
+    assert [i[0] for i in debug.filter_records(since=5)] == [6]
+    assert [i[0] for i in debug.filter_records(level=logging.INFO)] == [5, 6]
+    assert [i[0] for i in debug.filter_records(limit=1)] == [4]
+    assert debug.filter_records(module="main") == []
+    assert debug.filter_records(module="glagol")[0][4] == "msg3"
+
+    filters = utils.parse_debug_query({"since": "5", "level": "info", "limit": "2"})
+    assert filters == {"since": 5, "level": logging.INFO, "module": None, "limit": 2}
+    for query in ({"since": "abc"}, {"limit": "x"}, {"limit": "0"}, {"level": "foo"}):
+        try:
+            utils.parse_debug_query(query)
+            assert False, query
+        except ValueError:
+            pass
+
+
+def test_recognition_chunk_cache(tmp_path, monkeypatch):
+    folder = tmp_path / "frontend_latest"
+    folder.mkdir()
+    (folder / "chunk.1.js").write_bytes(b"foo")
+    (folder / "chunk.2.js").write_bytes(b"this.recognition.lang=en-US")
+    monkeypatch.setattr(utils.frontend, "_frontend_root", lambda _: tmp_path)
+    monkeypatch.setattr(utils, "frontend_version", lambda: "20240306.0")
+
+    cache_path = str(tmp_path / "cache")
+    chunk = ("chunk.2.js", b"this.recognition.lang=ru-RU")
+    assert (
+        utils.patch_recognition_chunk("frontend_latest", "ru-RU", cache_path) == chunk
+    )
+
+    # second call uses cache without scanning folder
+    (folder / "chunk.2.js").unlink()
+    assert (
+        utils.patch_recognition_chunk("frontend_latest", "ru-RU", cache_path) == chunk
+    )
+    assert utils.patch_recognition_chunk("frontend_latest", "en-GB", cache_path) is None
+
+
+def test_send_command():
+    class Glagol:
+        async def send(self, data: dict) -> dict:
+            return {"text": data["text"]}
+
+    class Entity:
+        def __init__(self, glagol):
+            self.glagol = glagol
+
+    entities = {"media_player.s1": Entity(Glagol()), "media_player.s2": Entity(None)}
+    data = {"command": "sendText", "text": "hi"}
+
+    async def main():
+        assert await utils.send_command(entities, ["media_player.s1"], data) == {
+            "text": "hi"
+        }
+        # one requested entity always with plain response
+        assert await utils.send_command(entities, ["media_player.s2"], data) == {
+            "error": "Entity not found"
+        }
+        assert await utils.send_command(
+            entities, ["media_player.s1", "media_player.s2", "media_player.s3"], data
+        ) == {
+            "media_player.s1": {"text": "hi"},
+            "media_player.s2": {"error": "Entity not found"},
+            "media_player.s3": {"error": "Entity not found"},
+        }
+
+    asyncio.run(main())
@@ -0,0 +1,492 @@
+import asyncio
+import copy
+import json
+
+from custom_components.yandex_station.core.yandex_quasar import (
+    ALARMS_FAILED_TTL,
+    SCENARIOS_ECHO_TIME,
+    YandexQuasar,
+)
+
+from . import FakeResponse, FakeSession
+
+
+def test_alarms_cache():
+    def handler(method: str, url: str, json: dict = None, **kwargs):
+        assert json == {"device_ids": ["D1", "D2"]}
+        return {
+            "alarms": [
+                {"alarm_id": "1", "device_id": "D1"},
+                {"alarm_id": "2", "device_id": "D2"},
+                {"alarm_id": "3", "device_id": "D1"},
+            ]
+        }
+
+    session = FakeSession(handler)
+    quasar = YandexQuasar(session)
+    quasar.devices = [
+        {"id": i, "capabilities": [{}], "quasar_info": {"device_id": i, "platform": ""}}
+        for i in ("D1", "D2")
+    ]
+
+    async def main():
+        return await asyncio.gather(
+            quasar.get_alarms(quasar.devices[0]), quasar.get_alarms(quasar.devices[1])
+        )
+
+    alarms1, alarms2 = asyncio.run(main())
+    assert [i["alarm_id"] for i in alarms1] == ["1", "3"]
+    assert [i["alarm_id"] for i in alarms2] == ["2"]
+    assert len(session.calls) == 1
+
+
+def test_alarms_invalidate():
+    quasar = YandexQuasar(None)
+    quasar.devices = [
+        {
+            "id": "D1",
+            "capabilities": [{}],
+            "quasar_info": {"device_id": "D1", "platform": ""},
+        }
+    ]
+    device = quasar.devices[0]
+
+    def handler(method: str, url: str, **kwargs):
+        # alarm changed while loading alarms
+        quasar.invalidate_alarms()
+        return {"alarms": []}
+
+    quasar.session = FakeSession(handler)
+
+    async def main():
+        assert await quasar.get_alarms(device) == []
+        assert quasar.alarms is None
+
+    asyncio.run(main())
+
+
+def test_alarms_fallback():
+    def handler(method: str, url: str, json: dict = None, **kwargs):
+        if json["device_ids"] == ["D1"]:
+            return {"alarms": [{"alarm_id": "1", "device_id": "D1"}]}
+        # bad device breaks common request
+        return FakeResponse({"error": "bad device"}, status=400)
+
+    session = FakeSession(handler)
+    quasar = YandexQuasar(session)
+    quasar.devices = [
+        {"id": i, "capabilities": [{}], "quasar_info": {"device_id": i, "platform": ""}}
+        for i in ("D1", "D2")
+    ]
+
+    async def main():
+        alarms = await quasar.get_alarms(quasar.devices[0])
+        assert [i["alarm_id"] for i in alarms] == ["1"]
+        try:
+            await quasar.get_alarms(quasar.devices[1])
+            assert False
+        except Exception:
+            pass
+        # common and one per device
+        assert len(session.calls) == 3
+
+        # next cycle skips failed device
+        quasar.alarms_ts = 0
+        alarms = await quasar.get_alarms(quasar.devices[0])
+        assert [i["alarm_id"] for i in alarms] == ["1"]
+        try:
+            await quasar.get_alarms(quasar.devices[1])
+            assert False
+        except Exception:
+            pass
+        assert len(session.calls) == 4
+
+        # failed device is asked again after some time
+        quasar.alarms_ts = 0
+        quasar.alarms_failed["D2"] -= ALARMS_FAILED_TTL
+        await quasar.get_alarms(quasar.devices[0])
+        assert len(session.calls) == 7
+
+    asyncio.run(main())
+
+
+def test_scenario_pool():
+    session = FakeSession(lambda *args, **kwargs: {"status": "ok", "scenario_id": "S2"})
+    quasar = YandexQuasar(session)
+    quasar.scenarios = [
+        {"id": "S1", "triggers": [{"value": "е"}]},  # encode("1")
+    ]
+    quasar.devices = [
+        {"id": "1", "name": "", "capabilities": [{}], "quasar_info": {"platform": ""}}
+    ]
+
+    async def main():
+        await quasar.load_speakers()
+        device = quasar.devices[0]
+        await quasar.send(device, "test", is_tts=True)
+        await quasar.send(device, "test", is_tts=True)
+        await asyncio.gather(quasar.send(device, "test1"), quasar.send(device, "test2"))
+
+    asyncio.run(main())
+    assert quasar.devices[0]["scenario_id"] == "S1"
+    assert [m + " " + url.split("/scenarios")[1] for m, url in session.calls] == [
+        "put /S1",
+        "post /S1/actions",
+        "post /S1/actions",  # same command without put
+        "put /S1",
+        "post ",  # second scenario created on demand
+        "post /S1/actions",
+        "put /S2",
+        "post /S2/actions",
+    ]
+
+
+def test_broadcast_tts():
+    puts = []
+
+    def handler(method: str, url: str, json: dict = None, **kwargs):
+        if method == "put":
+            puts.append([i["id"] for i in json["steps"][0]["parameters"]["items"]])
+        return {"status": "ok"}
+
+    session = FakeSession(handler)
+    quasar = YandexQuasar(session)
+    quasar.scenarios = [
+        {"id": "S1", "triggers": [{"value": "е"}]},  # encode("1")
+        {"id": "S2", "triggers": [{"value": "а"}]},  # encode("2")
+    ]
+    quasar.devices = [
+        {"id": i, "name": "", "capabilities": [{}], "quasar_info": {"platform": ""}}
+        for i in ("1", "2")
+    ]
+
+    async def main():
+        await quasar.load_speakers()
+        await asyncio.gather(
+            *[quasar.send(device, "hello", is_tts=True) for device in quasar.devices],
+            quasar.send(quasar.devices[1], "hello", is_tts=True),
+        )
+
+    asyncio.run(main())
+    assert puts == [["1", "2"]]
+    assert [m for m, _ in session.calls] == ["put", "post"]
+    assert session.calls[1][1] == (
+        "https://iot.quasar.yandex.ru/m/user/scenarios/S1/actions"
+    )
+
+
+def test_dispatcher_topics():
+    class Target:
+        def __init__(self):
+            self.messages = []
+
+        def on_update(self, message: dict):
+            self.messages.append(message)
+
+    quasar = YandexQuasar(None)
+    quasar.devices = [
+        {"id": "1", "house_name": "Дом", "room_name": "Кухня"},
+        {"id": "2", "house_name": "Дом"},
+    ]
+
+    device, room, house, every = Target(), Target(), Target(), Target()
+    unsub = quasar.subscribe_update("1", device.on_update)
+    quasar.subscribe_update("1", device.on_update)  # no duplicates
+    quasar.subscribe_update("room/Дом/Кухня", room.on_update)
+    quasar.subscribe_update("house/Дом", house.on_update)
+    quasar.subscribe_update("*", every.on_update)
+
+    quasar.dispatch_update("1", {"id": "1"})
+    quasar.dispatch_update("2", {"id": "2"})
+    quasar.dispatch_update("1/online", {"id": "1"})
+    assert device.messages == [{"id": "1"}]
+    assert room.messages == [{"id": "1"}]
+    assert house.messages == [{"id": "1"}, {"id": "2"}]
+    assert every.messages == [{"id": "1"}, {"id": "2"}]
+
+    unsub()
+    quasar.dispatch_update("1", {"id": "1"})
+    assert len(device.messages) == 1
+
+    # deleted entities are unsubscribed automatically
+    del every
+    quasar.dispatch_update("2", {"id": "2"})
+    assert len(quasar.dispatcher["*"]) == 0
+
+
+def test_dispatch_devices():
+    quasar = YandexQuasar(None)
+    updates = []
+    quasar.subscribe_update("*", updates.append)
+
+    resp = {
+        "households": [
+            {"all": [{"id": "1", "state": "online"}, {"id": "2", "state": "online"}]}
+        ]
+    }
+    quasar.devices = resp["households"][0]["all"]
+    quasar.dispatch_devices(resp)
+    assert len(updates) == 2
+
+    # only changed devices after reconnect
+    resp = {
+        "households": [
+            {"all": [{"id": "1", "state": "online"}, {"id": "2", "state": "offline"}]}
+        ]
+    }
+    quasar.dispatch_devices(resp)
+    assert updates[2:] == [{"id": "2", "state": "offline"}]
+
+
+def test_voice_history_cursor():
+    def launch(id_: str, trigger: str = "scenario.trigger.voice") -> dict:
+        return {
+            "id": id_,
+            "trigger_type": trigger,
+            "launch_time": "2024-01-01T00:00:00Z",
+        }
+
+    history = [launch("3"), launch("2", "scenario.trigger.timetable"), launch("1")]
+    headers = {"Date": "Mon, 01 Jan 2024 00:00:02 GMT"}
+
+    def handler(method: str, url: str, **kwargs):
+        if url.endswith("/history"):
+            return FakeResponse({"scenarios": history}, headers=headers)
+        return FakeResponse({"launch": {"name": "", "steps": []}}, headers=headers)
+
+    session = FakeSession(handler)
+    quasar = YandexQuasar(session)
+
+    def urls() -> list:
+        return [url.rsplit("/", 1)[1] for _, url in session.calls]
+
+    async def main():
+        # without cursor only latest launch
+        await quasar.get_voice_trigger()
+        assert urls() == ["history", "3"]
+
+        # with cursor all new launches from older to newer
+        history[:0] = [launch("5"), launch("4")]
+        await quasar.get_voice_trigger()
+        assert urls()[2:] == ["history", "4", "5"]
+
+        # no new launches and no retries
+        await quasar.get_voice_trigger()
+        assert urls()[5:] == ["history"]
+
+        # launch from websocket message without requests
+        session.calls.clear()
+        message = {"launch": {**launch("6"), "name": "", "steps": []}}
+        await quasar.on_scenario_launch(json.dumps(message))
+        assert session.calls == []
+        assert "6" in quasar.history_seen
+
+        # broken websocket launch is loaded from history
+        history.insert(0, launch("7"))
+        item = {"type": "step.action.item.device", "value": {"quasar_info": {}}}
+        message = {
+            "launch": {**launch("7"), "steps": [{"parameters": {"items": [item]}}]}
+        }
+        await quasar.on_scenario_launch(json.dumps(message))
+        assert urls() == ["history", "7"]
+        assert "7" in quasar.history_seen
+
+    asyncio.run(main())
+
+
+def test_update_scenario_cache():
+    def handler(method: str, url: str, **kwargs):
+        if url.endswith("/edit"):
+            scenario = {"name": "Test", "steps": [], "triggers": []}
+            return {"status": "ok", "scenario": scenario}
+        if method == "get":
+            scenarios = [{"id": "S1", "name": "Test", "triggers": []}]
+            return {"status": "ok", "scenarios": scenarios}
+        return {"status": "ok"}
+
+    session = FakeSession(handler)
+    quasar = YandexQuasar(session)
+    quasar.scenarios = []
+    quasar.updates_connected = True
+
+    async def main():
+        await quasar.update_scenario("Test")
+        # websocket event about own change
+        quasar.on_scenario_list('{"scenario":{"id":"S1"}}')
+        await quasar.update_scenario("Test")
+        # one event for several own changes, or no event at all
+        quasar.on_scenario_list('{"scenario":{"id":"S1"}}')
+        # scenario changed outside HA later
+        quasar.scenarios_written["S1"] -= SCENARIOS_ECHO_TIME
+        quasar.on_scenario_list('{"scenario":{"id":"S1"}}')
+        await quasar.update_scenario("Test")
+        # no cache without updates connection
+        quasar.updates_connected = False
+        await quasar.update_scenario("Test")
+
+    asyncio.run(main())
+
+    assert [m + " " + url.split("/scenarios")[1] for m, url in session.calls] == [
+        "get ",
+        "get /S1/edit",
+        "put /S1",
+        "put /S1",  # cached payload
+        "get ",
+        "get /S1/edit",
+        "put /S1",
+        "get /S1/edit",
+        "put /S1",
+    ]
+
+
+def test_account_configs():
+    calls = []
+    server = {"jingle": False, "smartActivation": False}
+
+    def handler(method: str, url: str, json: dict = None, **kwargs):
+        calls.append((method, url.rsplit("/", 1)[1], json))
+        if method == "get":
+            return {"status": "ok", "config": dict(server)}
+        if url.endswith("/set_account_config"):
+            server.clear()
+            server.update(json)
+        return {"status": "ok"}
+
+    quasar = YandexQuasar(FakeSession(handler))
+
+    async def main():
+        await quasar.set_account_configs(
+            {
+                "без лишних слов": "да",
+                "анонсировать треки": "нет",
+                "звук активации": "да",
+                "кроссфейд": "да",
+            }
+        )
+        # changed outside HA
+        server["aliceProactivity"] = True
+        # concurrent changes don't lose each other
+        await asyncio.gather(
+            quasar.set_account_config("звук активации", "нет"),
+            quasar.set_account_config("одним устройством", "да"),
+        )
+
+    asyncio.run(main())
+
+    assert calls[:3] == [
+        (
+            "post",
+            "settings",
+            {
+                "iot": {"response_reaction_type": "sound"},
+                "music": {"announce_tracks": False},
+            },
+        ),
+        ("get", "get_account_config", None),
+        (
+            "post",
+            "set_account_config",
+            {
+                "jingle": True,
+                "smartActivation": False,
+                "audio_player": {"crossfadeEnabled": True},
+            },
+        ),
+    ]
+    # fresh config for each write
+    assert [i[0] for i in calls[3:]] == ["get", "post", "get", "post"]
+    assert server == {
+        "jingle": False,
+        "smartActivation": True,
+        "audio_player": {"crossfadeEnabled": True},
+        "aliceProactivity": True,
+    }
+
+
+def test_device_config_combine():
+    calls = []
+    server = {"config": {"beta": False}, "version": "1"}
+
+    def handler(method: str, url: str, json: dict = None, **kwargs):
+        if method == "get":
+            calls.append("get")
+            return {
+                "status": "ok",
+                "quasar_config": copy.deepcopy(server["config"]),
+                "quasar_config_version": server["version"],
+            }
+
+        calls.append(("post", json["config"]))
+        if json["version"] != server["version"]:
+            return {"status": "error", "code": "CONFLICT"}
+        server["config"] = json["config"]
+        server["version"] = str(int(server["version"]) + 1)
+        return {"status": "ok"}
+
+    quasar = YandexQuasar(FakeSession(handler))
+    device = {"id": "d1"}
+
+    def fail(config: dict):
+        raise ValueError
+
+    async def main():
+        config, version = await quasar.get_device_config(device, cached=True)
+        assert config == {"beta": False} and version == "1"
+        await quasar.get_device_config(device, cached=True)
+
+        # version changed outside HA
+        server["version"] = "5"
+
+        results = await asyncio.gather(
+            quasar.modify_device_config(device, lambda c: c.update(beta=True)),
+            quasar.modify_device_config(device, lambda c: c.update(locale="en-US")),
+            quasar.modify_device_config(device, fail),
+            quasar.modify_device_config(device, lambda c: c.update(dnd=True)),
+            return_exceptions=True,
+        )
+        assert results[:2] == [None, None] and results[3] is None
+        assert isinstance(results[2], ValueError)
+
+    asyncio.run(main())
+
+    assert calls == [
+        "get",
+        ("post", {"beta": True}),  # conflict with cached version
+        "get",
+        ("post", {"beta": True}),
+        "get",  # write without new version
+        ("post", {"beta": True, "locale": "en-US", "dnd": True}),
+    ]
+    assert server["config"] == {"beta": True, "locale": "en-US", "dnd": True}
+
+
+def test_device_config_error():
+    gets = []
+
+    def handler(method: str, url: str, **kwargs):
+        if method == "get":
+            gets.append(url)
+            if len(gets) == 2:
+                return FakeResponse({"status": "error"}, status=500)
+            return {"status": "ok", "quasar_config": {}, "quasar_config_version": "1"}
+        return {"status": "ok"}
+
+    quasar = YandexQuasar(FakeSession(handler))
+    device = {"id": "d1"}
+
+    async def main():
+        # second and third changes are written together and fail on load config
+        return await asyncio.wait_for(
+            asyncio.gather(
+                *[
+                    quasar.modify_device_config(device, lambda c: c.update(beta=True))
+                    for _ in range(3)
+                ],
+                return_exceptions=True,
+            ),
+            1,
+        )
+
+    results = asyncio.run(main())
+    assert results[0] is None
+    assert all(isinstance(i, AssertionError) for i in results[1:])
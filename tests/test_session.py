@@ -0,0 +1,97 @@
+import asyncio
+
+from aiohttp import ClientSession
+
+from custom_components.yandex_station.core import yandex_session
+from custom_components.yandex_station.core.yandex_session import YandexSession
+
+from . import FakeResponse
+
+
+def test_session_single_flight():
+    calls = []
+    saves = []
+
+    async def fake_get(url, **kwargs):
+        calls.append(url)
+        await asyncio.sleep(0)
+        return FakeResponse('"csrfToken2":"token"')
+
+    async def listener(**kwargs):
+        saves.append(kwargs)
+
+    async def main():
+        session = YandexSession(ClientSession())
+        session._get = fake_get
+        session.add_update_listener(listener)
+        tokens = await asyncio.gather(*[session.update_csrf_token() for _ in range(5)])
+        assert tokens == ["token"] * 5
+
+        await session._handle_update()
+        await session._handle_update()
+        await session.client_session.close()
+
+    asyncio.run(main())
+
+    assert calls == ["https://yandex.ru/quasar"]
+    assert len(saves) == 1
+
+
+def test_session_retry_breaker(monkeypatch):
+    responses = []
+    calls = []
+    delays = []
+
+    async def fake_request(method, url, **kwargs):
+        calls.append(kwargs.get("params"))
+        return responses.pop(0)
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(yandex_session.asyncio, "sleep", fake_sleep)
+
+    async def main():
+        session = YandexSession(ClientSession(), music_token="token")
+        session._request = fake_request
+
+        # retry keeps kwargs and respects Retry-After
+        responses.extend(
+            [FakeResponse(status=503, headers={"Retry-After": "3"}), FakeResponse()]
+        )
+        url = "https://api.music.yandex.net/tracks"
+        r = await session.request_glagol(url, params={"a": 1})
+        assert r.status == 200
+        assert calls == [{"a": 1}, {"a": 1}]
+        assert delays == [3]
+
+        stats = session.stats["api.music.yandex.net"].as_dict()
+        assert stats["requests"] == 2
+        assert stats["errors"] == 1
+        assert stats["retries"] == 1
+        assert stats["in_flight"] == 0
+        assert stats["latency"]["count"] == 2
+
+        breaker = session.breakers["api.music.yandex.net"]
+        assert breaker.state == "closed"
+        for _ in range(yandex_session.BREAKER_FAILURES):
+            breaker.failure()
+        assert breaker.state == "open"
+
+        # fail fast without requests
+        calls.clear()
+        try:
+            await session.request_glagol(url)
+            assert False
+        except Exception as e:
+            assert "circuit breaker is open" in str(e)
+        assert calls == []
+
+        breaker.open_ts = 0
+        assert breaker.state == "half_open"
+        breaker.success()
+        assert breaker.state == "closed"
+
+        await session.client_session.close()
+
+    asyncio.run(main())